@@ -1,39 +1,45 @@
 import os
+import threading
+import time
+import uuid
 from pathlib import Path
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory, flash, Response
-
-# Import existing steganography helpers
-import encoding as image_encoding
-import decoding as image_decoding
-from encode_audio import encode_audio as audio_encode, convert_to_wav
-from decode_audio import decode_audio as audio_decode
-from PIL import Image
-import wave
+from flask import Flask, render_template, request, redirect, url_for, send_from_directory, flash, Response, jsonify
+
+# Light imports only: the stego modules (NumPy/PIL) load on first use, see warm.py
+from tasks import run_task
+from jobs import JobQueue, QueueFull
+from container import COMPRESSION
+from output_format import FORMATS
+from capacity import carrier_capacity, check_fits, lookup as capacity_lookup
+from carrier_cache import prune_expired
+from media import is_medium
+import metrics
+from metrics import stage
+from warm import pool_options, preload
 
 BASE_DIR = Path(__file__).parent.resolve()
 UPLOADS_DIR = BASE_DIR / "uploads"
-OUTPUTS_DIR = BASE_DIR / "outputs"
+OUTPUTS_DIR = BASE_DIR / "outputs"  # both created on first use, not at import
 
-UPLOADS_DIR.mkdir(exist_ok=True)
-OUTPUTS_DIR.mkdir(exist_ok=True)
+# Per-request outputs/<id>/ and uploads/<id>/ directories are deleted after this many seconds (0 keeps them)
+OUTPUT_TTL = float(os.environ.get("STEGO_OUTPUT_TTL", "3600"))
+SWEEP_INTERVAL = 60
 
-ALLOWED_IMAGE_EXTS = {"png", "jpg", "jpeg"}
-ALLOWED_AUDIO_EXTS = {"wav", "mp3", "aac", "m4a", "flac", "ogg"}
+_STEGO_HELPERS = {"image_embed_file", "image_extract_file", "audio_embed_file", "audio_extract_file"}
 
 
-def allowed_file(filename: str, kind: str) -> bool:
-    if "." not in filename:
-        return False
-    ext = filename.rsplit(".", 1)[1].lower()
-    if kind == "image":
-        return ext in ALLOWED_IMAGE_EXTS
-    if kind == "audio":
-        return ext in ALLOWED_AUDIO_EXTS
-    return False
+def __getattr__(name):
+    # The stego_files helpers stay importable from app, loaded on first access
+    if name in _STEGO_HELPERS:
+        import stego_files
+        return getattr(stego_files, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 app = Flask(__name__)
 app.secret_key = "replace-this-with-a-random-secret"
+# Let a fronting nginx/Apache send output files (X-Sendfile) when enabled
+app.config["USE_X_SENDFILE"] = os.environ.get("STEGO_X_SENDFILE") == "1"
 
 
 @app.route("/")
@@ -41,327 +47,268 @@ def index():
     return render_template("index.html")
 
 
-# ------------------------------
-# File-payload helpers (do not affect existing text encode/decode)
-# Header format:
-#  MAGIC(4 bytes = b'STG1') | name_len(2 bytes BE) | name UTF-8 | payload_len(4 bytes BE) | payload
-MAGIC = b"STG1"
-
-
-def _bytes_to_bits(data: bytes):
-    for byte in data:
-        for i in range(8):
-            yield (byte >> (7 - i)) & 1
-
-
-def _bits_to_bytes(bits_iter, total_bits: int) -> bytes:
-    out = bytearray()
-    value = 0
-    count = 0
-    for b in bits_iter:
-        value = (value << 1) | (b & 1)
-        count += 1
-        if count == 8:
-            out.append(value)
-            value = 0
-            count = 0
-        if len(out) * 8 >= total_bits:
-            break
-    return bytes(out)
-
-
-def image_embed_file(input_image: str, output_image: str, payload_path: str, display_name: str):
-    with open(payload_path, "rb") as f:
-        payload = f.read()
-    name_bytes = display_name.encode("utf-8")
-    if len(name_bytes) > 65535:
-        raise ValueError("Filename too long to embed")
-    header = MAGIC + len(name_bytes).to_bytes(2, "big") + name_bytes + len(payload).to_bytes(4, "big")
-    blob = header + payload
-
-    im = Image.open(input_image)
-    if im.mode != 'RGB':
-        im = im.convert('RGB')
-    w, h = im.size
-    pixels = im.load()
-
-    max_capacity_bits = w * h  # using 1 bit (R channel LSB) per pixel
-    total_bits = len(blob) * 8
-    if total_bits > max_capacity_bits:
-        raise ValueError("Payload too large for this image")
-
-    bit_iter = _bytes_to_bits(blob)
-    written = 0
-    for y in range(h):
-        for x in range(w):
-            if written >= total_bits:
-                break
-            r, g, b = pixels[x, y]
-            bit = next(bit_iter)
-            r = (r & 0xFE) | bit
-            pixels[x, y] = (r, g, b)
-            written += 1
-        if written >= total_bits:
-            break
-    im.save(output_image, 'PNG')
-
-
-def image_extract_file(input_image: str, output_dir: Path) -> Path:
-    im = Image.open(input_image)
-    if im.mode != 'RGB':
-        im = im.convert('RGB')
-    w, h = im.size
-    pixels = im.load()
-
-    # Build a generator of bits from R channel
-    def bit_stream():
-        for y in range(h):
-            for x in range(w):
-                r, g, b = pixels[x, y]
-                yield r & 1
-
-    bits = bit_stream()
-    # Read first 4 bytes for magic (32 bits)
-    magic = _bits_to_bytes(bits, 32)
-    if magic != MAGIC:
-        raise ValueError("File payload not found (magic mismatch). Try Text decode.")
-
-    # name_len (16 bits)
-    name_len = int.from_bytes(_bits_to_bytes(bits, 16), "big")
-    name_bytes = _bits_to_bytes(bits, name_len * 8)
-    filename = name_bytes.decode("utf-8", errors="replace")
-    # payload_len (32 bits)
-    payload_bits_len = int.from_bytes(_bits_to_bytes(bits, 32), "big") * 8
-    data = _bits_to_bytes(bits, payload_bits_len)
-
-    # Prevent directory traversal
-    base_name = Path(filename).name
-    out_path = output_dir / base_name
-    # Ensure unique filename without overwriting existing files
-    if out_path.exists():
-        stem, suffix = Path(base_name).stem, Path(base_name).suffix
-        counter = 1
-        while True:
-            candidate = output_dir / f"{stem} ({counter}){suffix}"
-            if not candidate.exists():
-                out_path = candidate
-                break
-            counter += 1
-    with open(out_path, "wb") as f:
-        f.write(data)
-    return out_path
-
-
-def audio_embed_file(input_file: str, payload_path: str, outputs_dir: Path):
-    # Convert to temp WAV
-    temp_wav = str(outputs_dir / "_temp_embed.wav")
-    convert_to_wav(input_file, temp_wav)
-
-    with open(payload_path, "rb") as f:
-        payload = f.read()
-    name = Path(payload_path).name
-    name_bytes = name.encode("utf-8")
-    if len(name_bytes) > 65535:
-        raise ValueError("Filename too long to embed")
-    header = MAGIC + len(name_bytes).to_bytes(2, "big") + name_bytes + len(payload).to_bytes(4, "big")
-    blob = header + payload
-
-    wav = wave.open(temp_wav, 'rb')
-    frames = bytearray(list(wav.readframes(wav.getnframes())))
-    params = wav.getparams()
-    wav.close()
-
-    total_bits = len(blob) * 8
-    if total_bits > len(frames):
-        raise ValueError("Payload too large for this audio")
-
-    bit_iter = _bytes_to_bits(blob)
-    for i in range(total_bits):
-        frames[i] = (frames[i] & 254) | next(bit_iter)
-
-    stem = Path(input_file).stem
-    stego_wav = outputs_dir / f"{stem}_file_stego.wav"
-    out = wave.open(str(stego_wav), 'wb')
-    out.setparams(params)
-    out.writeframes(frames)
-    out.close()
-
-    # Clean up
-    try:
-        os.remove(temp_wav)
-    except OSError:
-        pass
-
-    return stego_wav
-
-
-def audio_extract_file(stego_wav_path: str, outputs_dir: Path) -> Path:
-    wav = wave.open(stego_wav_path, 'rb')
-    frames = bytearray(list(wav.readframes(wav.getnframes())))
-    wav.close()
-
-    def bit_stream():
-        for byte in frames:
-            yield byte & 1
-
-    bits = bit_stream()
-    magic = _bits_to_bytes(bits, 32)
-    if magic != MAGIC:
-        raise ValueError("File payload not found (magic mismatch). Try Text decode.")
-    name_len = int.from_bytes(_bits_to_bytes(bits, 16), "big")
-    name_bytes = _bits_to_bytes(bits, name_len * 8)
-    filename = name_bytes.decode("utf-8", errors="replace")
-    payload_bits_len = int.from_bytes(_bits_to_bytes(bits, 32), "big") * 8
-    data = _bits_to_bytes(bits, payload_bits_len)
-
-    base_name = Path(filename).name
-    out_path = outputs_dir / base_name
-    if out_path.exists():
-        stem, suffix = Path(base_name).stem, Path(base_name).suffix
-        counter = 1
-        while True:
-            candidate = outputs_dir / f"{stem} ({counter}){suffix}"
-            if not candidate.exists():
-                out_path = candidate
-                break
-            counter += 1
-    with open(out_path, "wb") as f:
-        f.write(data)
-    return out_path
-
-
-@app.route("/process", methods=["POST"])
-def process():
+def _prepare_spec(outputs_dir: Path, upload_dir: Path):
+    """Validate the submitted form and save its uploads to upload_dir. Returns (task spec, error message)."""
     medium = request.form.get("medium")  # image|audio
     action = request.form.get("action")  # encode|decode
     payload_type = request.form.get("payload_type", "text")  # text|file
     message = request.form.get("message", "")
     upload = request.files.get("file")
     payload_file = request.files.get("payload")  # file payload for encode
+    # image bit layout preset, e.g. rgb2 (see layout.PRESETS), or audio sample layout, e.g. s2 (audio_layout.PRESETS)
+    layout = request.form.get("layout") or None
+    compression = request.form.get("compression") or None  # none|zlib|lzma: STG2 container; empty: legacy format
+    passphrase = request.form.get("passphrase") or None  # scatter bits in a keyed order (same one to decode)
+    output_format = request.form.get("output_format") or None  # stego image encoder preset, see output_format.FORMATS
 
     if medium not in {"image", "audio"} or action not in {"encode", "decode"}:
-        flash("Invalid selection.")
-        return redirect(url_for("index"))
+        return None, "Invalid selection."
+
+    if compression is not None and compression not in COMPRESSION:
+        return None, "Invalid compression mode."
+
+    if output_format is not None and output_format not in FORMATS:
+        return None, "Invalid output format."
 
     if not upload or upload.filename == "":
-        flash("Please choose a file to upload.")
-        return redirect(url_for("index"))
+        return None, "Please choose a file to upload."
 
-    if not allowed_file(upload.filename, medium):
-        flash("Unsupported file type for the selected medium.")
-        return redirect(url_for("index"))
+    if not is_medium(upload.filename, medium):
+        return None, "Unsupported file type for the selected medium."
 
-    # Save upload
-    safe_name = Path(upload.filename).name
-    upload_path = UPLOADS_DIR / safe_name
-    upload.save(upload_path)
+    if action == "encode":
+        if payload_type == "text" and not message:
+            return None, "Please enter a secret message to encode."
+        if payload_type != "text" and (not payload_file or payload_file.filename == ""):
+            return None, "Please choose a payload file to embed."
+    elif medium == "audio" and Path(upload.filename).suffix.lower() != ".wav":
+        return None, "Please upload a stego WAV file for decoding."
 
-    result = {"medium": medium, "action": action, "payload_type": payload_type, "message": None, "downloads": []}
+    outputs_dir.mkdir(parents=True, exist_ok=True)
 
+    safe_name = Path(upload.filename).name
+    spec = {
+        "medium": medium, "action": action, "payload_type": payload_type, "message": message,
+        "upload": upload.stream, "upload_name": safe_name, "payload": None, "payload_name": None,
+        "layout": layout, "compression": compression, "passphrase": passphrase, "output_format": output_format,
+        "outputs_dir": str(outputs_dir),
+    }
+    if action == "encode" and payload_type != "text":
+        spec["payload"] = payload_file.stream
+        spec["payload_name"] = Path(payload_file.filename).name
+
+    # Header-only capacity preflight, before any pixel or sample work (or saving)
     try:
-        if medium == "image":
-            if action == "encode":
-                output_name = f"{upload_path.stem}_stego.png"
-                output_path = OUTPUTS_DIR / output_name
-                if payload_type == "text":
-                    if not message:
-                        flash("Please enter a secret message to encode.")
-                        return redirect(url_for("index"))
-                    image_encoding.embed(str(upload_path), str(output_path), message)
-                else:
-                    if not payload_file or payload_file.filename == "":
-                        flash("Please choose a payload file to embed.")
-                        return redirect(url_for("index"))
-                    payload_name = Path(payload_file.filename).name
-                    payload_path = UPLOADS_DIR / ("payload_" + payload_name)
-                    payload_file.save(payload_path)
-                    image_embed_file(str(upload_path), str(output_path), str(payload_path), payload_name)
-                result["downloads"].append({
-                    "label": "Download stego image",
-                    "href": url_for("download", filename=output_name)
-                })
-            else:  # decode (auto-detect file payload; fallback to text)
-                try:
-                    out_path = image_extract_file(str(upload_path), OUTPUTS_DIR)
-                    result["downloads"].append({
-                        "label": f"Download extracted file ({out_path.name})",
-                        "href": url_for("download", filename=out_path.name, name=out_path.name)
-                    })
-                except Exception as e:
-                    # If not file payload, fallback to text decode
-                    extracted = image_decoding.extract(str(upload_path))
-                    result["message"] = extracted
-
-        else:  # audio
-            if action == "encode":
-                if payload_type == "text":
-                    if not message:
-                        flash("Please enter a secret message to encode.")
-                        return redirect(url_for("index"))
-                    # Call provided audio encoder; it writes outputs in CWD
-                    cwd = os.getcwd()
-                    try:
-                        os.chdir(str(OUTPUTS_DIR))
-                        audio_encode(str(upload_path), message)
-                        stem = upload_path.stem
-                        wav_out = f"{stem}_stego.wav"
-                        orig_ext = upload_path.suffix
-                        alt_out = f"{stem}_stego{orig_ext}"
-                        if Path(wav_out).exists():
-                            result["downloads"].append({
-                                "label": "Download stego WAV",
-                                "href": url_for("download", filename=wav_out)
-                            })
-                        if Path(alt_out).exists() and alt_out != wav_out:
-                            result["downloads"].append({
-                                "label": f"Download stego {orig_ext[1:].upper()}",
-                                "href": url_for("download", filename=alt_out)
-                            })
-                    finally:
-                        os.chdir(cwd)
-                else:
-                    if not payload_file or payload_file.filename == "":
-                        flash("Please choose a payload file to embed.")
-                        return redirect(url_for("index"))
-                    payload_name = Path(payload_file.filename).name
-                    payload_path = UPLOADS_DIR / ("payload_" + payload_name)
-                    payload_file.save(payload_path)
-                    stego_wav = audio_embed_file(str(upload_path), str(payload_path), OUTPUTS_DIR)
-                    result["downloads"].append({
-                        "label": "Download stego WAV",
-                        "href": url_for("download", filename=stego_wav.name)
-                    })
-            else:  # decode (auto-detect file payload; fallback to text)
-                if upload_path.suffix.lower() != ".wav":
-                    flash("Please upload a stego WAV file for decoding.")
-                    return redirect(url_for("index"))
-                try:
-                    out_path = audio_extract_file(str(upload_path), OUTPUTS_DIR)
-                    result["downloads"].append({
-                        "label": f"Download extracted file ({out_path.name})",
-                        "href": url_for("download", filename=out_path.name, name=out_path.name)
-                    })
-                except Exception:
-                    extracted = audio_decode(str(upload_path))
-                    result["message"] = extracted
-
-        return render_template("index.html", result=result)
+        with stage("preflight"):
+            error = check_fits(spec)
+    except Exception as exc:
+        error = f"Error: {exc}"
+    if error:
+        return None, error
+
+    # Save uploads: the task runs in a worker process
+    with stage("save_upload"):
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        upload_path = upload_dir / safe_name
+        upload.save(upload_path)
+        spec["upload"] = str(upload_path)
+        if spec["payload"] is not None:
+            payload_path = upload_dir / ("payload_" + spec["payload_name"])
+            payload_file.save(payload_path)
+            spec["payload"] = str(payload_path)
+    if metrics.PROFILE_DIR:
+        spec["profile"] = str(Path(metrics.PROFILE_DIR) / f"{outputs_dir.name}.prof")
+    return spec, None
+
+
+def _download_links(downloads, prefix: str = ""):
+    links = []
+    for d in downloads:
+        params = {"name": d["name"]} if d.get("name") else {}
+        links.append({"label": d["label"], "href": url_for("download", filename=prefix + d["filename"], **params)})
+    return links
+
+
+RESULT_FIELDS = ("medium", "action", "payload_type")  # spec fields _result_page shows
+
+
+def _result_page(spec: dict, outcome: dict, prefix: str = ""):
+    result = {key: spec[key] for key in RESULT_FIELDS}
+    result.update(message=outcome["message"], downloads=_download_links(outcome["downloads"], prefix))
+    return render_template("index.html", result=result)
+
 
+_last_sweep = float("-inf")
+_sweep_lock = threading.Lock()
+
+
+def _sweep_expired():
+    """Delete expired request directories in the background, at most once per SWEEP_INTERVAL."""
+    global _last_sweep
+    if OUTPUT_TTL <= 0:
+        return
+    with _sweep_lock:
+        now = time.monotonic()
+        if now - _last_sweep < SWEEP_INTERVAL:
+            return
+        _last_sweep = now
+    keep = job_queue.active_ids()  # a slow job's files are never pulled from under it
+
+    def sweep():
+        for root in (OUTPUTS_DIR, UPLOADS_DIR):
+            prune_expired(root, OUTPUT_TTL, keep)
+    threading.Thread(target=sweep, daemon=True).start()
+
+
+@app.route("/process", methods=["POST"])
+def process():
+    # The form's work runs in the job queue like /jobs; the browser is sent to the
+    # result page, which refreshes itself until the job is done.
+    job_id, error, _ = _submit_form()
+    if error:
+        flash(error)
+        return redirect(url_for("index"))
+    return redirect(url_for("job_result", job_id=job_id))
+
+
+@app.route("/capacity", methods=["GET", "POST"])
+def capacity():
+    """Payload capacity in bytes per layout, from the carrier header only.
+
+    POST a carrier as `file` (with `medium`), or GET /capacity?sha256=<hex> to
+    look up a carrier seen before without uploading it again.
+    """
+    digest = request.values.get("sha256")
+    if digest:
+        info = capacity_lookup(digest.lower())
+        if info is None:
+            return jsonify({"error": "Unknown carrier, upload it instead."}), 404
+        return jsonify(info)
+
+    upload = request.files.get("file")
+    medium = request.form.get("medium")
+    if not upload or upload.filename == "":
+        return jsonify({"error": "Please choose a file to upload."}), 400
+    if medium not in {"image", "audio"}:
+        medium = "image" if is_medium(upload.filename, "image") else "audio"
+    if not is_medium(upload.filename, medium):
+        return jsonify({"error": "Unsupported file type for the selected medium."}), 400
+    try:
+        return jsonify(carrier_capacity(upload.stream, medium))
     except Exception as exc:
-        flash(f"Error: {exc}")
+        return jsonify({"error": str(exc)}), 400
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Request/stage timing histograms, byte and error counters (Prometheus text format)."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+# ------------------------------
+# Background jobs: /process and /jobs queue their work in the job queue's process
+# pool. Each job gets its own uploads/<id>/ and outputs/<id>/ directories.
+job_queue = JobQueue(pool_options=pool_options())
+
+
+def warm_up():
+    """Load the stego modules and start the job workers now instead of on the first request.
+
+    Under a multi-process WSGI server call it once per server worker, e.g. from
+    gunicorn's post_worker_init hook.
+    """
+    preload()
+    job_queue.start()
+
+
+def _submit_form():
+    """Validate the form, save its uploads and queue the task. Returns (job id, error message, HTTP status)."""
+    _sweep_expired()
+    job_id = uuid.uuid4().hex
+    labels = metrics.labels_for(request.form)
+    start = time.perf_counter()
+    with metrics.trace() as trace:
+        with stage("prepare"):
+            spec, error = _prepare_spec(OUTPUTS_DIR / job_id, UPLOADS_DIR / job_id)
+    if error:
+        metrics.record_error(labels, "invalid")
+        return None, error, 400
+
+    def on_done(future):
+        # Jobs run in worker processes: their stage timings come back with the result
+        if future.cancelled() or future.exception() is not None:
+            metrics.record_error(labels, "cancelled" if future.cancelled() else type(future.exception()).__name__)
+            return
+        outcome = future.result()
+        metrics.record(labels, time.perf_counter() - start, {**trace.stages, **outcome["timings"]},
+                       outcome["bytes"])
+
+    # Only what the result page needs stays in this process: not the message or passphrase.
+    # spec itself is pickled to the worker asynchronously, so it is not touched after submit.
+    meta = {key: spec[key] for key in RESULT_FIELDS}
+    try:
+        job_queue.submit(run_task, spec, job_id=job_id, meta=meta, on_done=on_done)
+    except QueueFull as exc:
+        metrics.record_error(labels, "queue_full")
+        return None, str(exc), 429
+    return job_id, None, 202
+
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    job_id, error, status = _submit_form()
+    if error:
+        return jsonify(error=error), status
+    return jsonify(id=job_id, status_url=url_for("job_status", job_id=job_id),
+                   result_url=url_for("job_result", job_id=job_id)), 202
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id: str):
+    info = job_queue.status(job_id)
+    if info is None:
+        return jsonify(error="Unknown job"), 404
+    if info["result"] is not None:
+        info["result"] = {
+            "message": info["result"]["message"],
+            "downloads": _download_links(info["result"]["downloads"], f"{job_id}/"),
+        }
+    del info["meta"]
+    return jsonify(info)
+
+
+@app.route("/jobs/<job_id>/result")
+def job_result(job_id: str):
+    info = job_queue.status(job_id)
+    if info is None:
+        return jsonify(error="Unknown job"), 404
+    if info["state"] == "failed":
+        flash(f"Error: {info['error']}")
         return redirect(url_for("index"))
+    if info["state"] != "done":
+        # Browsers sent here by /process reload until the job finishes
+        return jsonify(id=job_id, state=info["state"]), 202, {"Refresh": "1"}
+    return _result_page(info["meta"], info["result"], f"{job_id}/")
 
 
 @app.route("/download/<path:filename>")
 def download(filename: str):
     # Optional custom download name via query param (?name=...)
+    # conditional=True answers Range/If-None-Match requests; the file body goes out
+    # through the server's file wrapper (sendfile) or X-Sendfile, never read into memory.
     download_name = request.args.get("name")
+    with metrics.DOWNLOAD_SECONDS.time():
+        return _send_output(filename, download_name)
+
+
+def _send_output(filename: str, download_name):
     try:
         return send_from_directory(
             str(OUTPUTS_DIR),
             filename,
             as_attachment=True,
             download_name=download_name if download_name else None,
+            conditional=True,
         )
     except TypeError:
         # For older Flask versions without download_name, fallback
@@ -373,7 +320,11 @@ def download(filename: str):
 
 
 if __name__ == "__main__":
-    # Run the server
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # debug=True runs this module again in the reloader's child, which is the one serving
+    if job_queue.prefork and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warm_up()
+    # Run the server; request handling is thread-safe, so serve requests concurrently
+    # (or run under a multi-worker WSGI server, e.g. gunicorn -w 4 app:app)
+    app.run(host="0.0.0.0", port=5000, debug=True, threaded=True)
 
 
@@ -0,0 +1,450 @@
+# audio_engine.py
+# NumPy view over WAV frame buffers for the audio encoders/decoders.
+# In the original format every byte of the raw frame data carries one payload
+# bit in its LSB, in order from the first frame or, with a passphrase, in a
+# keyed scattered order. With a sample layout (see audio_layout.py) only the
+# low bits of each sample's least significant byte are used, through a strided
+# view of the frame buffer, in the selected channels.
+#  STEGO_MAX_AUDIO_TEXT  bytes searched for the end of a delimiter-terminated text message
+#                        before the carrier is taken to hold none (default 1 MiB, 0 = no limit)
+import os
+import tempfile
+import wave
+
+import numpy as np
+
+from bitplane import bits_to_bytes, bytes_to_bits, bytes_to_text, embed_bits, iter_chunks, pack_groups, unpack_groups
+from audio_layout import AudioLayout, HEADER_SAMPLES
+from scatter import Permutation
+import parallel
+
+DELIMITER = "###"
+CHUNK_FRAMES = 64 * 1024  # must stay a multiple of 8
+SCATTER_BLOCK_FRAMES = 4096  # frames read per seek when gathering scattered bits
+SCATTER_BLOCK_SLOTS = 1 << 18  # payload slots placed or gathered per permutation block
+SPILL_BYTES = 8 * 1024 * 1024  # placed scattered slots beyond this many bytes spill to a temp file
+MAX_TEXT_BYTES = int(os.environ.get("STEGO_MAX_AUDIO_TEXT", str(1 << 20)))
+
+
+def open_wav(src):
+    """wave.open() for a path or a (rewound) file-like object such as an in-memory WAV."""
+    if hasattr(src, "seek"):
+        src.seek(0)
+        return wave.open(src, 'rb')
+    return wave.open(str(src), 'rb')
+
+
+def wav_capacity(src, layout=None) -> int:
+    """Payload bits a WAV holds (one per raw frame byte without a layout), read from its header only."""
+    with open_wav(src) as wav:
+        if layout is not None:
+            return layout.capacity(wav.getnframes(), wav.getnchannels())
+        return wav.getnframes() * wav.getsampwidth() * wav.getnchannels()
+
+
+def scatter_permutation(src, passphrase, layout=None):
+    """Frame-byte (or, with a sample layout, sample slot) permutation for a passphrase; None without one."""
+    if not passphrase:
+        return None
+    if layout is None:
+        return Permutation(passphrase, wav_capacity(src))
+    with open_wav(src) as wav:
+        return Permutation(passphrase, layout.slots(wav.getnframes(), wav.getnchannels()))
+
+
+def low_bytes(buf, sampwidth: int, nchannels: int) -> np.ndarray:
+    """(frames x channels) view of the least significant byte of every sample (writable for a bytearray)."""
+    return np.frombuffer(buf, dtype=np.uint8)[::sampwidth].reshape(-1, nchannels)
+
+
+def _slot_positions(slots: np.ndarray, layout: AudioLayout, nchannels: int, sampwidth: int) -> np.ndarray:
+    """Frame-byte positions of the low bytes behind sample slots."""
+    channels = np.asarray(layout.selected(nchannels))
+    frame, index = np.divmod(slots, len(channels))
+    return (frame + layout.header_frames(nchannels)) * nchannels * sampwidth + channels[index] * sampwidth
+
+
+def _place_block(item, perm, positions_of, region_bytes: int) -> list:
+    """[(region, uint32 offset-in-region << 8 | value)] for one block of payload slots, by region."""
+    first, values = item
+    positions = perm.range(first, first + len(values), dtype=np.uint32)
+    if positions_of is not None:
+        positions = positions_of(positions)
+    keys = (positions.astype(np.uint64) << np.uint64(8)) | values
+    keys.sort()
+    regions = (keys >> np.uint64(8)) // np.uint64(region_bytes)
+    placed = (keys - ((regions * np.uint64(region_bytes)) << np.uint64(8))).astype(np.uint32)
+    bounds = np.flatnonzero(np.diff(regions)) + 1
+    return [(int(regions[lo]), placed[lo:hi]) for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(keys)])]
+
+
+def _spill_scattered(feed, group: int, perm, positions_of, region_bytes: int, workers: int):
+    """Place the payload one block of slots at a time: (spill file, {region: [(offset, count)]}).
+
+    Payload bits come from feed, `group` per slot; every placed slot is stored
+    as a uint32 in the spill file, in runs per carrier region of region_bytes
+    frame bytes, so memory use does not depend on the payload length.
+    """
+    spill = tempfile.SpooledTemporaryFile(SPILL_BYTES)
+    segments = {}
+    first = 0
+    place = lambda item: _place_block(item, perm, positions_of, region_bytes)
+    while True:
+        batch = []
+        while len(batch) < workers:
+            bits = feed.take(SCATTER_BLOCK_SLOTS * group)
+            if not len(bits):
+                break
+            values = pack_groups(bits, group)
+            batch.append((first, values))
+            first += len(values)
+        if not batch:
+            break
+        for placed in parallel.run(place, batch, workers):
+            for region, run in placed:
+                segments.setdefault(region, []).append((spill.tell(), len(run)))
+                spill.write(run.tobytes())
+        if len(batch) < workers:
+            break
+    return spill, segments
+
+
+def _copy_scattered(src, dst, parts, perm, chunk_frames: int, workers: int, layout: AudioLayout = None):
+    # Two passes: the payload is placed block by block into a spill file (see
+    # _spill_scattered), then the carrier streams through once, region by
+    # region, taking its slots from the spill. Each slot sets the low bit of its
+    # frame byte (original format) or the layout's low bits of a sample's low byte.
+    nchannels, sampwidth = src.getnchannels(), src.getsampwidth()
+    frame_size = nchannels * sampwidth
+    region_frames = min(chunk_frames, (1 << 24) // frame_size)  # offset << 8 must fit a uint32
+    if layout is None:
+        group, positions_of, header = 1, None, None
+    else:
+        if src.getnframes() * nchannels < HEADER_SAMPLES:
+            raise ValueError("Audio too short for a sample layout")
+        group, header = layout.bits, bytes_to_bits(layout.to_header())
+        positions_of = lambda slots: _slot_positions(slots, layout, nchannels, sampwidth)
+    keep = np.uint8(~((1 << group) - 1) & 0xFF)
+    spill, segments = _spill_scattered(_BitFeed(parts), group, perm, positions_of, region_frames * frame_size,
+                                       workers)
+    with spill:
+        region = 0
+        while True:
+            chunk = src.readframes(region_frames)
+            if not chunk:
+                break
+            runs = segments.pop(region, None)
+            if runs or (region == 0 and header is not None):
+                buf = bytearray(chunk)
+                if region == 0 and header is not None:
+                    flat = low_bytes(buf, sampwidth, nchannels).reshape(-1)[:HEADER_SAMPLES]
+                    flat &= 0xFE
+                    flat |= header
+                if runs:
+                    placed = np.concatenate([_read_run(spill, offset, count) for offset, count in runs])
+                    frames = np.frombuffer(buf, dtype=np.uint8)
+                    idx = placed >> np.uint32(8)
+                    frames[idx] = (frames[idx] & keep) | (placed & np.uint32(0xFF)).astype(np.uint8)
+                chunk = buf
+            dst.writeframesraw(chunk)
+            region += 1
+
+
+def _read_run(spill, offset: int, count: int) -> np.ndarray:
+    spill.seek(offset)
+    return np.frombuffer(spill.read(count * 4), dtype=np.uint32)
+
+
+class _BitFeed:
+    """Payload bits from a sequence of byte parts, handed out in any counts."""
+
+    def __init__(self, parts):
+        self._blocks = iter_chunks(parts, 1024 * 1024)
+        self._bits = np.zeros(0, dtype=np.uint8)
+
+    def take(self, count: int) -> np.ndarray:
+        while len(self._bits) < count:
+            block = next(self._blocks, None)
+            if block is None:
+                break
+            self._bits = np.concatenate([self._bits, bytes_to_bits(block)])
+        bits, self._bits = self._bits[:count], self._bits[count:]
+        return bits
+
+
+def _embed_sample_chunk(item, layout: AudioLayout, nchannels: int, sampwidth: int):
+    chunk, frame, bits = item
+    if frame > 0 and not len(bits):
+        return chunk
+    buf = bytearray(chunk)
+    view = low_bytes(buf, sampwidth, nchannels)
+    if frame == 0:
+        flat = view.reshape(-1)[:HEADER_SAMPLES]
+        flat &= 0xFE
+        flat |= bytes_to_bits(layout.to_header())
+    channels = layout.selected(nchannels)
+    k = layout.bits
+    values = pack_groups(bits, k)
+    row = max(0, layout.header_frames(nchannels) - frame)
+    keep = np.uint8(~((1 << k) - 1) & 0xFF)
+    for j, channel in enumerate(channels):
+        column = values[j::len(channels)]
+        target = view[row:row + len(column), channel]
+        target &= keep
+        target |= column
+    return buf
+
+
+def _copy_samples(src, dst, parts, layout: AudioLayout, chunk_frames: int, workers: int):
+    nchannels, sampwidth = src.getnchannels(), src.getsampwidth()
+    if src.getnframes() * nchannels < HEADER_SAMPLES:
+        raise ValueError("Audio too short for a sample layout")
+    header_frames = layout.header_frames(nchannels)
+    per_frame = len(layout.selected(nchannels)) * layout.bits
+    feed = _BitFeed(parts)
+    frame = 0
+    embed = lambda item: _embed_sample_chunk(item, layout, nchannels, sampwidth)
+    while True:
+        batch = []
+        while len(batch) < workers:
+            chunk = src.readframes(chunk_frames)
+            if not chunk:
+                break
+            frames = len(chunk) // (nchannels * sampwidth)
+            payload_frames = max(0, frame + frames - max(frame, header_frames))
+            batch.append((chunk, frame, feed.take(payload_frames * per_frame)))
+            frame += frames
+        if not batch:
+            break
+        carrying = sum(len(bits) > 0 for _, _, bits in batch)
+        for chunk in parallel.run(embed, batch, workers if carrying > 1 else 1):
+            dst.writeframesraw(chunk)
+        if len(batch) < workers:
+            break
+
+
+def _embed_chunk(item):
+    chunk, block = item
+    if block is None:
+        return chunk
+    buf = bytearray(chunk)
+    embed_bits(np.frombuffer(buf, dtype=np.uint8), bytes_to_bits(block))
+    return buf
+
+
+def embed_stream(src_wav, dst_wav, data, chunk_frames: int = CHUNK_FRAMES, perm=None, workers=None, layout=None):
+    """Copy src_wav to dst_wav in fixed-size chunks, embedding data into the leading frame bytes.
+
+    data is bytes or a sequence of bytes / binary file objects that are read in
+    order, so a payload never has to be joined with its header in memory.
+    dst_wav may be a path or a writable binary file object. Only chunks that
+    carry payload bits are unpacked; the rest are copied straight through, so
+    memory use does not depend on the carrier or payload length.
+    With perm (see scatter_permutation) payload bit i goes to frame byte perm(i);
+    the placed bits pass through a spill file, so memory stays bounded there too.
+    With workers > 1 (default: STEGO_THREADS) that many chunks are read and
+    embedded by threads at a time, then written in order.
+    With a sample layout (see audio_layout.py) the layout header and payload go
+    into the low bits of each sample's low byte instead; perm then permutes
+    sample slots (see scatter_permutation).
+    """
+    workers = parallel.resolve(workers)
+    parts = [data] if isinstance(data, (bytes, bytearray)) else data
+    target = dst_wav if hasattr(dst_wav, "write") else str(dst_wav)
+    with open_wav(src_wav) as src, wave.open(target, 'wb') as dst:
+        dst.setparams(src.getparams())
+        if layout is not None:
+            if layout.order == "scatter":
+                _copy_scattered(src, dst, parts, perm, chunk_frames, workers, layout)
+            else:
+                _copy_samples(src, dst, parts, layout, chunk_frames, workers)
+            return
+        if perm is not None:
+            _copy_scattered(src, dst, parts, perm, chunk_frames, workers)
+            return
+        # chunk_frames is a multiple of 8, so every full chunk holds whole payload bytes
+        blocks = iter_chunks(parts, chunk_frames * src.getsampwidth() * src.getnchannels() // 8)
+        pending = next(blocks, None)
+        while True:
+            batch = []
+            while len(batch) < workers:
+                chunk = src.readframes(chunk_frames)
+                if not chunk:
+                    break
+                batch.append((chunk, pending))
+                if pending is not None:
+                    pending = next(blocks, None)
+            if not batch:
+                break
+            carrying = sum(block is not None for _, block in batch)
+            for chunk in parallel.run(_embed_chunk, batch, workers if carrying > 1 else 1):
+                dst.writeframesraw(chunk)
+            if len(batch) < workers:
+                break
+
+
+def lsb_bytes(frames: np.ndarray) -> bytes:
+    """Pack the LSB of every whole group of 8 frame bytes into a byte string."""
+    usable = len(frames) - len(frames) % 8
+    return bits_to_bytes(frames[:usable] & 1)
+
+
+def _find_marker(data: bytearray, searched: int, marker: bytes, limit: int) -> bool:
+    """Cut data at the marker if it is there yet; ValueError once `limit` bytes hold none."""
+    end = data.find(marker, max(0, searched - len(marker) + 1))
+    if end >= 0:
+        del data[end:]
+        return True
+    if limit and len(data) >= limit + len(marker):
+        raise ValueError("No hidden data found in this audio.")
+    return False
+
+
+def _extract_text_reader(reader, marker: bytes, chunk_frames: int, limit: int) -> str:
+    data = bytearray()
+    offset, count = 0, chunk_frames * 8
+    while True:
+        bits = reader.read_bits(count, offset)
+        searched = len(data)
+        data += bits_to_bytes(bits[:len(bits) - len(bits) % 8])
+        if _find_marker(data, searched, marker, limit):
+            return bytes_to_text(bytes(data))
+        if len(bits) < count:
+            raise ValueError("No hidden data found in this audio.")
+        offset += count
+        count = min(count * 2, CHUNK_FRAMES * 8)
+
+
+def extract_text(stego_wav, delimiter: str = DELIMITER, chunk_frames: int = 4096, passphrase=None,
+                 max_bytes=None) -> str:
+    """Decode a delimiter-terminated message, reading frames only until the delimiter shows up.
+
+    Nothing records where such a message ends, so without the delimiter in the
+    first max_bytes bytes (default MAX_TEXT_BYTES, 0 = the whole carrier) or
+    anywhere in the carrier, ValueError reports that there is no message.
+    """
+    marker = delimiter.encode("latin-1")
+    limit = MAX_TEXT_BYTES if max_bytes is None else max_bytes
+    with WavLSBReader(stego_wav, passphrase) as reader:
+        if passphrase or reader.layout is not None:
+            return _extract_text_reader(reader, marker, chunk_frames, limit)
+    data = bytearray()
+    with open_wav(stego_wav) as wav:
+        while True:
+            chunk = wav.readframes(chunk_frames)
+            if not chunk:
+                raise ValueError("No hidden data found in this audio.")
+            searched = len(data)
+            data += lsb_bytes(np.frombuffer(chunk, dtype=np.uint8))
+            if _find_marker(data, searched, marker, limit):
+                return bytes_to_text(bytes(data))
+            chunk_frames = min(chunk_frames * 2, CHUNK_FRAMES)
+
+
+class WavLSBReader:
+    """Payload bit reader that seeks to and reads only the frames covering a bit range.
+
+    A sample layout header (see audio_layout.py) is detected first; without
+    one, every frame byte holds one bit (the original format). Scattered bits
+    are read from their positions, one block of frames per seek; the original
+    format is scattered whenever a passphrase is given, a sample layout when
+    its header says so (the passphrase is checked on the first read).
+    """
+
+    def __init__(self, path, passphrase=None):
+        self._wav = open_wav(path)
+        self._nchannels, self._sampwidth = self._wav.getnchannels(), self._wav.getsampwidth()
+        self._frame_size = self._sampwidth * self._nchannels
+        frames = self._wav.getnframes()
+        self.layout = self._read_layout()
+        self._passphrase = passphrase
+        self._perm = None  # built on the first scattered read (key derivation is deliberately slow)
+        if self.layout is None:
+            self.capacity = frames * self._frame_size
+            return
+        self._channels = list(self.layout.selected(self._nchannels))
+        self._header_frames = self.layout.header_frames(self._nchannels)
+        self.capacity = self.layout.capacity(frames, self._nchannels)
+
+    @property
+    def needs_passphrase(self) -> bool:
+        """True for a scattered sample layout opened without a passphrase."""
+        return self.layout is not None and self.layout.order == "scatter" and not self._passphrase
+
+    def _read_layout(self):
+        if self._wav.getnframes() * self._nchannels < HEADER_SAMPLES:
+            return None
+        self._wav.setpos(0)
+        frames = self._wav.readframes(AudioLayout.header_frames(self._nchannels))
+        head = low_bytes(frames, self._sampwidth, self._nchannels).reshape(-1)[:HEADER_SAMPLES] & 1
+        return AudioLayout.from_header(bits_to_bytes(head))
+
+    def _gather(self, first: int, stop: int, positions_of=None) -> np.ndarray:
+        """Frame bytes behind permuted slots first..stop-1, one block of SCATTER_BLOCK_SLOTS at a time."""
+        values = np.empty(stop - first, dtype=np.uint8)
+        for lo in range(first, stop, SCATTER_BLOCK_SLOTS):
+            hi = min(lo + SCATTER_BLOCK_SLOTS, stop)
+            positions = self._perm.range(lo, hi, dtype=np.uint32)
+            if positions_of is not None:
+                positions = positions_of(positions)
+            values[lo - first:hi - first] = self._gather_block(positions)
+        return values
+
+    def _gather_block(self, positions: np.ndarray) -> np.ndarray:
+        block = SCATTER_BLOCK_FRAMES * self._frame_size
+        order = np.argsort(positions)
+        ordered = positions[order]
+        blocks = ordered // block
+        bounds = np.flatnonzero(np.diff(blocks)) + 1
+        values = np.empty(len(ordered), dtype=np.uint8)
+        for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(ordered)]):
+            first = int(blocks[lo]) * SCATTER_BLOCK_FRAMES
+            self._wav.setpos(first)
+            frames = np.frombuffer(self._wav.readframes(SCATTER_BLOCK_FRAMES), dtype=np.uint8)
+            values[lo:hi] = frames[ordered[lo:hi] - first * self._frame_size]
+        gathered = np.empty_like(values)
+        gathered[order] = values
+        return gathered
+
+    def _read_samples(self, offset: int, end: int) -> np.ndarray:
+        if self.layout.order == "scatter" and self._perm is None:
+            if not self._passphrase:
+                raise ValueError("This carrier uses a scattered layout; a passphrase is required")
+            self._perm = Permutation(self._passphrase, self.layout.slots(self._wav.getnframes(), self._nchannels))
+        k, nsel = self.layout.bits, len(self._channels)
+        s0, s1 = offset // k, -(-end // k)
+        if self._perm is not None:
+            values = self._gather(s0, s1, lambda slots: _slot_positions(slots, self.layout, self._nchannels,
+                                                                        self._sampwidth))
+        else:
+            r0, r1 = s0 // nsel, -(-s1 // nsel)
+            self._wav.setpos(self._header_frames + r0)
+            view = low_bytes(self._wav.readframes(r1 - r0), self._sampwidth, self._nchannels)
+            values = view[:, self._channels].reshape(-1)[s0 - r0 * nsel:s1 - r0 * nsel]
+        return unpack_groups(values, k)[offset - s0 * k:end - s0 * k]
+
+    def read_bits(self, count: int, offset: int = 0) -> np.ndarray:
+        end = min(offset + count, self.capacity)
+        if end <= offset:
+            return np.zeros(0, dtype=np.uint8)
+        if self.layout is not None:
+            return self._read_samples(offset, end)
+        if self._passphrase:
+            if self._perm is None:
+                self._perm = Permutation(self._passphrase, self.capacity)
+            return self._gather(offset, end) & 1
+        first = offset // self._frame_size
+        last = -(-end // self._frame_size)
+        self._wav.setpos(first)
+        frames = np.frombuffer(self._wav.readframes(last - first), dtype=np.uint8)
+        start = offset - first * self._frame_size
+        return frames[start:start + end - offset] & 1
+
+    def close(self):
+        self._wav.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
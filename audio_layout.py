@@ -0,0 +1,102 @@
+# audio_layout.py
+# Sample-domain layouts for PCM WAV carriers. The original audio format puts
+# one payload bit in every raw frame byte, so with 16-bit (or wider) samples
+# half the bits land in high bytes. A sample layout instead uses the low bits
+# of the least significant byte of each sample, in the selected channels only.
+# It is announced by an 8-byte header in the LSBs of the low bytes of the
+# first HEADER_SAMPLES interleaved samples:
+#  MAGIC(4 bytes = b'STGA') | version(1) | bits per sample(1) | channel mask(1) | order(1)
+# Carriers without this header use the original byte format (layout None).
+from dataclasses import dataclass, replace
+
+AUDIO_LAYOUT_MAGIC = b"STGA"
+AUDIO_LAYOUT_VERSION = 1
+HEADER_SAMPLES = 64
+MAX_CHANNELS = 8
+
+ORDERS = ("sample", "scatter")
+
+
+@dataclass(frozen=True)
+class AudioLayout:
+    bits: int = 1          # low bits used per sample (1-4)
+    channels: tuple = ()   # channel indices carrying payload, () = every channel
+    order: str = "sample"  # "sample": frame by frame; "scatter": keyed pseudo-random sample order
+
+    def __post_init__(self):
+        if not 1 <= self.bits <= 4:
+            raise ValueError("Bits per sample must be between 1 and 4")
+        if any(not 0 <= c < MAX_CHANNELS for c in self.channels) or list(self.channels) != sorted(set(self.channels)):
+            raise ValueError(f"Channels must be distinct indices below {MAX_CHANNELS}, in ascending order")
+        if self.order not in ORDERS:
+            raise ValueError(f"Order must be one of {', '.join(ORDERS)}")
+
+    def selected(self, nchannels: int) -> tuple:
+        """Channel indices carrying payload in a carrier with nchannels channels."""
+        if not self.channels:
+            return tuple(range(nchannels))
+        if self.channels[-1] >= nchannels:
+            raise ValueError(f"Channel {self.channels[-1]} does not exist in this {nchannels}-channel audio")
+        return self.channels
+
+    @staticmethod
+    def header_frames(nchannels: int) -> int:
+        """Frames holding the layout header; payload slots start after them."""
+        return -(-HEADER_SAMPLES // nchannels)
+
+    def slots(self, frames: int, nchannels: int) -> int:
+        """Samples available for payload in a carrier of `frames` frames."""
+        return max(0, frames - self.header_frames(nchannels)) * len(self.selected(nchannels))
+
+    def capacity(self, frames: int, nchannels: int) -> int:
+        """Payload bits available in a carrier of `frames` frames."""
+        return self.slots(frames, nchannels) * self.bits
+
+    def scattered(self) -> "AudioLayout":
+        """Same bits and channels in keyed pseudo-random order."""
+        return replace(self, order="scatter")
+
+    def to_header(self) -> bytes:
+        mask = sum(1 << c for c in self.channels)
+        return AUDIO_LAYOUT_MAGIC + bytes([AUDIO_LAYOUT_VERSION, self.bits, mask, ORDERS.index(self.order)])
+
+    @classmethod
+    def from_header(cls, data: bytes):
+        """Layout recorded in an 8-byte header, or None if there is no layout header."""
+        if data[:4] != AUDIO_LAYOUT_MAGIC:
+            return None
+        version, bits, mask, order = data[4:8]
+        if version != AUDIO_LAYOUT_VERSION:
+            raise ValueError(f"Unsupported audio layout header version {version}")
+        if order >= len(ORDERS) or not 1 <= bits <= 4:
+            raise ValueError("Corrupt audio layout header")
+        return cls(bits, tuple(c for c in range(MAX_CHANNELS) if mask >> c & 1), ORDERS[order])
+
+
+PRESETS = {
+    "s1": AudioLayout(1),
+    "s2": AudioLayout(2),
+    "s3": AudioLayout(3),
+    "s4": AudioLayout(4),
+}
+
+
+def parse_audio_layout(spec):
+    """Accept an AudioLayout, a preset name or 'BITS[:CHANNELS[:ORDER]]' (e.g. '2:0,1').
+
+    None, "" and "bytes" select the original byte format and return None.
+    """
+    if spec is None or spec == "" or spec == "bytes":
+        return None
+    if isinstance(spec, AudioLayout):
+        return spec
+    if spec.lower() in PRESETS:
+        return PRESETS[spec.lower()]
+    parts = spec.split(":")
+    try:
+        bits = int(parts[0])
+        channels = tuple(sorted({int(c) for c in parts[1].split(",") if c.strip()})) if len(parts) > 1 else ()
+    except ValueError:
+        raise ValueError(f"Invalid audio layout '{spec}'") from None
+    order = parts[2].lower() if len(parts) > 2 else "sample"
+    return AudioLayout(bits, channels, order)
@@ -0,0 +1,188 @@
+# batch.py
+# Embed into or extract from many carriers in one process start.
+#
+#   python batch.py embed --manifest jobs.csv
+#   python batch.py embed --glob "carriers/*.png" --payload secret.zip --out-dir stego/
+#   python batch.py extract --glob "stego/*.wav" --out-dir extracted/ --workers 8
+#
+# Manifests are CSV (with a header row) or JSONL, one item per row/line:
+#   carrier  input image/audio file
+#   payload  file to embed (embed only; or use `message` for text)
+#   message  text to embed instead of a payload file
+#   output   stego file to write (embed) or directory for extracted data (extract)
+#   layout   optional image layout (see layout.PRESETS) or audio sample layout (audio_layout.PRESETS)
+#   compression  optional none|zlib|lzma to embed an STG2 container (see container.py)
+#   passphrase   optional; scatters the bits in a keyed order (and is needed to extract)
+#   output_format  optional stego image encoder preset, see output_format.FORMATS
+# Work is spread over a process pool; every file gets its own ok/error record and
+# a throughput summary is printed at the end.
+import argparse
+import contextlib
+import csv
+import glob
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from media import IMAGE_EXTS
+from output_format import FORMATS, parse_format
+from warm import pool_options
+
+
+def load_manifest(path: str) -> list:
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            return [json.loads(line) for line in f if line.strip()]
+        return list(csv.DictReader(f))
+
+
+def items_from_glob(pattern: str, action: str, out_dir: str, payload=None, message=None, layout=None,
+                    compression=None, passphrase=None, output_format=None) -> list:
+    items = []
+    for carrier in sorted(glob.glob(pattern, recursive=True)):
+        item = {"carrier": carrier, "layout": layout, "compression": compression, "passphrase": passphrase,
+                "output_format": output_format}
+        if action == "embed":
+            suffix = parse_format(output_format).suffix if Path(carrier).suffix.lower() in IMAGE_EXTS else ".wav"
+            item.update(payload=payload, message=message,
+                        output=str(Path(out_dir) / f"{Path(carrier).stem}_stego{suffix}"))
+        else:
+            item["output"] = out_dir
+        items.append(item)
+    return items
+
+
+def run_item(action: str, item: dict) -> dict:
+    """Process one manifest item; never raises, errors are reported per file."""
+    # Imported here so the parent process stays light; pool workers import them as they start (warm.py)
+    import encoding
+    import decoding
+    from encode_audio import encode_audio
+    from decode_audio import decode_audio
+    from stego_files import image_embed_file, image_extract_file, audio_embed_file, audio_extract_file
+    from detect import payload_kind
+
+    carrier = item["carrier"]
+    is_image = Path(carrier).suffix.lower() in IMAGE_EXTS
+    payload, message = item.get("payload") or None, item.get("message") or None
+    output = item.get("output")
+    layout = item.get("layout") or None
+    compression = item.get("compression") or None
+    passphrase = item.get("passphrase") or None
+    output_format = item.get("output_format") or None
+    record = {"carrier": carrier, "ok": False, "output": None, "error": None, "bytes": 0}
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            if action == "embed":
+                if not output:
+                    raise ValueError("No output path")
+                Path(output).parent.mkdir(parents=True, exist_ok=True)
+                if payload:
+                    record["bytes"] = os.path.getsize(payload)
+                    if is_image:
+                        image_embed_file(carrier, output, payload, Path(payload).name, layout, compression, passphrase,
+                                         output_format=output_format)
+                    else:
+                        audio_embed_file(carrier, payload, None, stego_wav=output, compression=compression,
+                                         passphrase=passphrase, layout=layout)
+                elif message:
+                    record["bytes"] = len(message)
+                    if is_image:
+                        encoding.embed(carrier, output, message, layout, compression, passphrase,
+                                       output_format=output_format)
+                    else:
+                        encode_audio(carrier, message, stego_file=output, compression=compression,
+                                     passphrase=passphrase, layout=layout)
+                else:
+                    raise ValueError("Nothing to embed (give a payload or a message)")
+                record["output"] = output
+            else:
+                out_dir = Path(output or ".")
+                out_dir.mkdir(parents=True, exist_ok=True)
+                # Detect the payload type first, so only the matching extractor runs
+                if payload_kind(carrier, "image" if is_image else "audio", passphrase) == "file":
+                    out_path = (image_extract_file if is_image else audio_extract_file)(carrier, out_dir, passphrase)
+                else:
+                    text = decoding.extract(carrier, passphrase) if is_image else decode_audio(carrier, passphrase)
+                    out_path = out_dir / f"{Path(carrier).stem}.txt"
+                    out_path.write_text(text, encoding="utf-8")
+                record["bytes"] = out_path.stat().st_size
+                record["output"] = str(out_path)
+        record["ok"] = True
+    except Exception as exc:
+        record["error"] = f"{type(exc).__name__}: {exc}"
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+
+def run_batch(action: str, items: list, workers=None, progress=sys.stderr) -> dict:
+    start = time.perf_counter()
+    records = []
+    with ProcessPoolExecutor(max_workers=workers, **pool_options()) as pool:
+        futures = [pool.submit(run_item, action, item) for item in items]
+        for done, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            records.append(record)
+            if progress:
+                status = "ok" if record["ok"] else f"FAILED {record['error']}"
+                print(f"[{done}/{len(items)}] {record['carrier']}: {status}", file=progress)
+    elapsed = time.perf_counter() - start
+    ok = [r for r in records if r["ok"]]
+    total_bytes = sum(r["bytes"] for r in ok)
+    return {
+        "action": action,
+        "files": len(records),
+        "ok": len(ok),
+        "failed": len(records) - len(ok),
+        "seconds": elapsed,
+        "files_per_s": len(records) / elapsed if elapsed else None,
+        "payload_bytes_per_s": total_bytes / elapsed if elapsed else None,
+        "records": records,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch steganography embed/extract")
+    parser.add_argument("action", choices=["embed", "extract"])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--manifest", help="CSV or JSONL manifest")
+    source.add_argument("--glob", help="carrier glob pattern, e.g. 'in/**/*.png'")
+    parser.add_argument("--payload", help="payload file for every carrier (glob mode)")
+    parser.add_argument("--message", help="text message for every carrier (glob mode)")
+    parser.add_argument("--out-dir", default="batch_out", help="output directory (glob mode)")
+    parser.add_argument("--layout", help="image layout preset or audio sample layout (glob mode), e.g. rgb2 or s2")
+    parser.add_argument("--compression", choices=["none", "zlib", "lzma"],
+                        help="embed an STG2 container with this compression (glob mode)")
+    parser.add_argument("--passphrase", help="scatter bits in a keyed order / extract them (glob mode)")
+    parser.add_argument("--output-format", choices=list(FORMATS),
+                        help="stego image encoder preset (glob mode), e.g. png-fast or bmp")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--report", help="write per-file results as JSONL here")
+    parser.add_argument("--quiet", action="store_true", help="no per-file progress lines")
+    args = parser.parse_args(argv)
+
+    if args.manifest:
+        items = load_manifest(args.manifest)
+    else:
+        items = items_from_glob(args.glob, args.action, args.out_dir, args.payload, args.message, args.layout,
+                                args.compression, args.passphrase, args.output_format)
+    if not items:
+        parser.error("no carriers to process")
+
+    summary = run_batch(args.action, items, args.workers, None if args.quiet else sys.stderr)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            for record in summary["records"]:
+                f.write(json.dumps(record) + "\n")
+    print(f"{summary['ok']}/{summary['files']} ok, {summary['failed']} failed in {summary['seconds']:.2f}s "
+          f"({summary['files_per_s']:.1f} files/s, {summary['payload_bytes_per_s'] / 1e6:.2f} MB/s payload)")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
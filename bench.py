@@ -0,0 +1,353 @@
+# bench.py
+# Benchmark harness for every embed/extract path.
+#
+#   python bench.py                          # quick preset, JSON on stdout
+#   python bench.py --preset full --out bench.json
+#   python bench.py --compare old.json       # p50 latency ratios vs an earlier run
+#   python bench.py --output-format png-fast # stego image encoder preset
+#
+# Synthetic RGB PNG carriers and 44.1 kHz stereo PCM WAV carriers are generated
+# once per run. Each case runs in a fresh spawned process so its peak RSS is
+# its own. Carriers are WAV, so no ffmpeg run happens unless --ffmpeg points
+# the transcode layer at a local binary for lossy inputs. Besides the total
+# latency, every case reports p50 times per stage (decode, embed, encode, ...,
+# see metrics.py), so output encoding cost shows up separately. Startup is
+# measured too: fresh interpreters importing each entry point (see warm.py).
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+import numpy as np
+
+PRESETS = {
+    "quick": {"image_mp": [1, 4], "audio_seconds": [10, 60], "payload_kb": [1, 16, 64]},
+    "full": {"image_mp": [1, 12, 50], "audio_seconds": [10, 600, 7200], "payload_kb": [1, 64, 1024]},
+}
+
+IMAGE_OPS = ["encoding.embed", "decoding.extract", "image_embed_file", "image_extract_file"]
+AUDIO_OPS = ["encode_audio", "decode_audio", "audio_embed_file", "audio_extract_file"]
+TEXT_OPS = {"encoding.embed", "decoding.extract", "encode_audio", "decode_audio"}
+EXTRACT_OPS = {"decoding.extract", "image_extract_file", "decode_audio", "audio_extract_file"}
+# Code a fresh interpreter runs per startup case; "python" is the bare interpreter
+STARTUP_CASES = {
+    "python": "pass",
+    "app": "import app",
+    "tasks": "import tasks",
+    "batch": "import batch",
+    "detect": "import detect",
+    "stego_modules": "import warm; warm.preload()",
+}
+
+
+# ------------------------------
+# Synthetic carriers
+
+def make_image(path: Path, megapixels: float, seed: int = 0):
+    from PIL import Image
+    w = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    h = int(megapixels * 1e6 / w)
+    arr = np.random.default_rng(seed).integers(0, 256, (h, w, 3), dtype=np.uint8)
+    Image.fromarray(arr, 'RGB').save(path, 'PNG', compress_level=1)
+
+
+def make_wav(path: Path, seconds: float, seed: int = 0, rate: int = 44100):
+    rng = np.random.default_rng(seed)
+    remaining = int(seconds * rate)
+    with wave.open(str(path), 'wb') as out:
+        out.setnchannels(2)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        while remaining:
+            n = min(remaining, rate * 10)  # 10 s blocks keep generation memory flat
+            out.writeframesraw(rng.integers(-3000, 3000, n * 2, dtype=np.int16).tobytes())
+            remaining -= n
+
+
+def make_payload(path: Path, size: int, text: bool, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    if text:
+        data = rng.integers(ord('a'), ord('z') + 1, size, dtype=np.uint8).tobytes()
+    else:
+        data = rng.integers(0, 256, size, dtype=np.uint8).tobytes()
+    path.write_bytes(data)
+
+
+# ------------------------------
+# Operations (top-level so spawned children can run them by name)
+
+def run_op(op: str, carrier: str, payload: str, workdir: str, output_format=None):
+    import encoding
+    import decoding
+    import encode_audio
+    import decode_audio
+    import stego_files
+    work = Path(workdir)
+    if op == "encoding.embed":
+        encoding.embed(carrier, str(work / image_output(output_format)), Path(payload).read_text(),
+                       output_format=output_format)
+    elif op == "decoding.extract":
+        decoding.extract(carrier)
+    elif op == "image_embed_file":
+        stego_files.image_embed_file(carrier, str(work / image_output(output_format)), payload, Path(payload).name,
+                                     output_format=output_format)
+    elif op == "image_extract_file":
+        os.remove(stego_files.image_extract_file(carrier, work))
+    elif op == "encode_audio":
+        encode_audio.encode_audio(carrier, Path(payload).read_text(), work)
+    elif op == "decode_audio":
+        decode_audio.decode_audio(carrier)
+    elif op == "audio_embed_file":
+        stego_files.audio_embed_file(carrier, payload, work)
+    elif op == "audio_extract_file":
+        os.remove(stego_files.audio_extract_file(carrier, work))
+    else:
+        raise ValueError(f"Unknown operation {op}")
+
+
+def image_output(output_format=None) -> str:
+    from output_format import parse_format
+    return "out" + parse_format(output_format).suffix
+
+
+def _child(op, carrier, payload, workdir, repeat, output_format, conn):
+    import metrics
+    try:
+        latencies, stages = [], []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(repeat):
+                start = time.perf_counter()
+                with metrics.trace() as trace:
+                    run_op(op, carrier, payload, workdir, output_format)
+                latencies.append(time.perf_counter() - start)
+                stages.append(trace.stages)
+        conn.send({"latencies": latencies, "stages": stages,
+                   "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss})
+    except Exception as exc:
+        conn.send({"error": f"{type(exc).__name__}: {exc}"})
+    finally:
+        conn.close()
+
+
+def run_case(op, carrier, payload, workdir, repeat, output_format=None):
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_child, args=(op, carrier, payload, workdir, repeat, output_format, child))
+    proc.start()
+    child.close()
+    result = parent.recv() if parent.poll(None) else {"error": "no result"}
+    proc.join()
+    return result
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def summarize(result: dict, payload_bytes: int) -> dict:
+    if "error" in result:
+        return result
+    lat = result["latencies"]
+    p50 = statistics.median(lat)
+    return {
+        "latency_s": {"min": min(lat), "p50": p50, "p90": percentile(lat, 90),
+                      "p99": percentile(lat, 99), "max": max(lat)},
+        "throughput_bits_per_s": payload_bytes * 8 / p50 if p50 else None,
+        # p50 seconds per stage, e.g. "encode" is the stego image/WAV encoding alone
+        "stages_p50_s": {name: statistics.median(run.get(name, 0.0) for run in result["stages"])
+                         for name in sorted({n for run in result["stages"] for n in run})},
+        "peak_rss_kb": result["peak_rss_kb"],
+    }
+
+
+def measure_startup(repeat: int) -> dict:
+    """Seconds from process start to exit for each STARTUP_CASES entry (min and p50 of repeat runs)."""
+    results = {}
+    for name, code in STARTUP_CASES.items():
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                  cwd=Path(__file__).parent)
+            times.append(time.perf_counter() - start)
+            if proc.returncode:
+                break
+        if proc.returncode:
+            results[name] = {"error": (proc.stderr.strip().splitlines() or ["failed"])[-1]}
+        else:
+            results[name] = {"min": min(times), "p50": statistics.median(times)}
+        print(f"startup {name:14} " + (f"p50 {results[name]['p50'] * 1000:9.1f} ms" if "p50" in results[name]
+                                         else results[name]["error"]), file=sys.stderr)
+    return results
+
+
+# ------------------------------
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def capacity_bytes(medium: str, carrier: str) -> int:
+    """Payload bytes a carrier holds with the default layout (read from its header only)."""
+    if medium == "image":
+        from PIL import Image
+        with Image.open(carrier) as im:
+            return im.size[0] * im.size[1] // 8
+    from audio_engine import wav_capacity
+    return wav_capacity(carrier) // 8
+
+
+def prepare_extract_carrier(op, carrier, payload, workdir, output_format=None) -> str:
+    """Embed once (untimed) so the extract benchmark reads a real stego carrier."""
+    embed_op = {"decoding.extract": "encoding.embed", "image_extract_file": "image_embed_file",
+                "decode_audio": "encode_audio", "audio_extract_file": "audio_embed_file"}[op]
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_op(embed_op, carrier, payload, workdir, output_format)
+    produced = {"encoding.embed": image_output(output_format), "image_embed_file": image_output(output_format),
+                "encode_audio": f"{Path(carrier).stem}_stego.wav",
+                "audio_embed_file": f"{Path(carrier).stem}_file_stego.wav"}[embed_op]
+    stego = Path(workdir) / f"stego_{op}{Path(produced).suffix}"
+    shutil.move(str(Path(workdir) / produced), stego)
+    return str(stego)
+
+
+def run_benchmarks(args) -> dict:
+    preset = PRESETS[args.preset]
+    image_mp = args.image_mp or preset["image_mp"]
+    audio_seconds = args.audio_seconds or preset["audio_seconds"]
+    payload_kb = args.payload_kb or preset["payload_kb"]
+    if args.ffmpeg:
+        os.environ["STEGO_FFMPEG"] = args.ffmpeg  # inherited by spawned children
+    if args.threads:
+        os.environ["STEGO_THREADS"] = str(args.threads)
+    if not args.cache:
+        # Repeats reuse one carrier, so cached runs would only time cache hits
+        os.environ["STEGO_IMAGE_CACHE_MB"] = os.environ["STEGO_PCM_CACHE_MB"] = "0"
+
+    startup = measure_startup(args.repeat) if args.startup else None
+    results = []
+    with tempfile.TemporaryDirectory(prefix="stego-bench-") as tmp:
+        tmp = Path(tmp)
+        carriers = []
+        if "image" in args.media:
+            for mp in image_mp:
+                path = tmp / f"carrier_{mp}mp.png"
+                make_image(path, mp)
+                carriers.append(("image", f"{mp}MP", str(path), IMAGE_OPS))
+        if "audio" in args.media:
+            for sec in audio_seconds:
+                path = tmp / f"carrier_{sec}s.wav"
+                make_wav(path, sec)
+                carriers.append(("audio", f"{sec}s", str(path), AUDIO_OPS))
+
+        for medium, size_label, carrier, ops in carriers:
+            capacity = capacity_bytes(medium, carrier)
+            for kb in payload_kb:
+                size = int(kb * 1024)
+                for op in ops:
+                    if args.ops and op not in args.ops:
+                        continue
+                    workdir = tmp / "work"
+                    workdir.mkdir(exist_ok=True)
+                    payload = tmp / f"payload_{kb}k_{'txt' if op in TEXT_OPS else 'bin'}"
+                    if not payload.exists():
+                        make_payload(payload, size, op in TEXT_OPS)
+                    case = {"medium": medium, "carrier": size_label, "op": op, "payload_bytes": size}
+                    if size + 64 > capacity:  # room for the length/file headers too
+                        case["skipped"] = "payload does not fit this carrier"
+                        results.append(case)
+                        continue
+                    target = carrier
+                    if op in EXTRACT_OPS:
+                        target = prepare_extract_carrier(op, carrier, str(payload), str(workdir), args.output_format)
+                    case.update(summarize(run_case(op, target, str(payload), str(workdir), args.repeat,
+                                                   args.output_format), size))
+                    results.append(case)
+                    encode = case.get("stages_p50_s", {}).get("encode")
+                    print(f"{medium:5} {size_label:>7} {op:20} {kb:>6} KB  "
+                          + (f"p50 {case['latency_s']['p50'] * 1000:9.1f} ms" if "latency_s" in case
+                             else case.get("error", ""))
+                          + (f"  (encode {encode * 1000:.1f} ms)" if encode is not None else ""), file=sys.stderr)
+                    shutil.rmtree(workdir)
+
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "repeat": args.repeat,
+        "threads": int(os.environ.get("STEGO_THREADS", "1")),
+        "output_format": args.output_format or "png",
+        "startup_s": startup,
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict) -> list:
+    """p50 latency ratio (current / baseline) for cases present in both runs."""
+    def key(case):
+        return case["medium"], case["carrier"], case["op"], case["payload_bytes"]
+    base = {key(c): c for c in baseline["results"] if "latency_s" in c}
+    rows = []
+    for case in current["results"]:
+        old = base.get(key(case))
+        if old and "latency_s" in case:
+            rows.append({"case": "/".join(map(str, key(case))),
+                         "ratio_p50": case["latency_s"]["p50"] / old["latency_s"]["p50"]})
+    old_startup = baseline.get("startup_s") or {}
+    for name, case in (current.get("startup_s") or {}).items():
+        old = old_startup.get(name)
+        if old and "p50" in old and "p50" in case:
+            rows.append({"case": f"startup/{name}", "ratio_p50": case["p50"] / old["p50"]})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark steganography embed/extract paths")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--image-mp", type=float, nargs="+", help="image carrier sizes in megapixels")
+    parser.add_argument("--audio-seconds", type=float, nargs="+", help="audio carrier lengths in seconds")
+    parser.add_argument("--payload-kb", type=float, nargs="+", help="payload sizes in KiB")
+    parser.add_argument("--media", nargs="+", choices=["image", "audio"], default=["image", "audio"])
+    parser.add_argument("--ops", nargs="+", choices=IMAGE_OPS + AUDIO_OPS, help="only run these operations")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--ffmpeg", help="ffmpeg binary for the transcode layer")
+    parser.add_argument("--cache", action="store_true", help="keep the decoded-carrier caches enabled")
+    parser.add_argument("--threads", type=int, help="region threads per embed/extract (STEGO_THREADS)")
+    parser.add_argument("--output-format", help="stego image encoder preset, see output_format.FORMATS")
+    parser.add_argument("--no-startup", dest="startup", action="store_false",
+                        help="skip the interpreter startup/import timings")
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    parser.add_argument("--compare", help="earlier JSON result to compare p50 latencies against")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args)
+    if args.compare:
+        with open(args.compare) as f:
+            report["comparison"] = compare(report, json.load(f))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+# bitplane.py
+# Shared NumPy bit-plane engine used by the image encoders/decoders.
+# Carriers are handled as uint8 arrays; payload bits are packed/unpacked
+# MSB-first with np.packbits/np.unpackbits and written in one array op.
+# Where the bits go is described by a layout.Layout.
+import io
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from layout import DEFAULT_LAYOUT, HEADER_BITS, Layout
+from scatter import Permutation
+from carrier_cache import IMAGE_CACHE, file_digest
+from output_format import parse_format
+import parallel
+
+
+def bytes_to_bits(data: bytes) -> np.ndarray:
+    """Unpack bytes into a uint8 array of bits (MSB first)."""
+    return np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+
+
+def bits_to_bytes(bits: np.ndarray) -> bytes:
+    """Pack an array of bits (MSB first) back into bytes."""
+    return np.packbits(np.asarray(bits, dtype=np.uint8)).tobytes()
+
+
+def int_to_bits(value: int, width: int) -> np.ndarray:
+    """Big-endian fixed-width bit representation of an integer."""
+    shifts = np.arange(width - 1, -1, -1, dtype=np.uint64)
+    return ((np.uint64(value) >> shifts) & np.uint64(1)).astype(np.uint8)
+
+
+def bits_to_int(bits: np.ndarray) -> int:
+    value = 0
+    for bit in bits.tolist():
+        value = (value << 1) | bit
+    return value
+
+
+def text_to_bytes(s: str) -> bytes:
+    """One byte per character (low 8 bits of the code point), like the original encoders."""
+    return (np.fromiter(map(ord, s), dtype=np.uint32, count=len(s)) & 0xFF).astype(np.uint8).tobytes()
+
+
+def bytes_to_text(data: bytes) -> str:
+    return data.decode("latin-1")
+
+
+def iter_chunks(parts, size: int):
+    """Yield `size`-byte blocks (the last may be shorter) from a sequence of bytes and binary file objects."""
+    buf = bytearray()
+    for part in parts:
+        read = part.read if hasattr(part, "read") else io.BytesIO(part).read
+        while True:
+            block = read(size - len(buf))
+            if not block:
+                break
+            buf += block
+            if len(buf) == size:
+                yield bytes(buf)
+                buf.clear()
+    if buf:
+        yield bytes(buf)
+
+
+def load_image(image, mode: str = 'RGB'):
+    """Open an image (path or file object) and return (H x W x channels uint8 array, PIL info dict).
+
+    Decoded arrays are cached by content hash; callers always get their own writable copy.
+    """
+    key = None
+    if IMAGE_CACHE.max_bytes:
+        key = (file_digest(image), mode)
+        hit = IMAGE_CACHE.get(key)
+        if hit is not None:
+            return hit[0].copy(), dict(hit[1])
+    if hasattr(image, "seek"):
+        image.seek(0)
+    im = Image.open(image)
+    if im.mode != mode:
+        im = im.convert(mode)
+    arr = np.array(im)
+    if key is not None:
+        cached = arr.copy()
+        cached.flags.writeable = False
+        IMAGE_CACHE.put(key, (cached, dict(im.info)))
+    return arr, im.info
+
+
+def _open(image):
+    if hasattr(image, "seek"):
+        image.seek(0)
+    return Image.open(image)
+
+
+def _pixels(im, mode: str) -> np.ndarray:
+    if im.mode != mode:
+        im = im.convert(mode)
+    return np.array(im)
+
+
+def load_rows(image, rows: int, mode: str = 'RGB') -> np.ndarray:
+    """Decode only the first `rows` rows of a non-interlaced PNG (other images are decoded whole)."""
+    im = _open(image)
+    w, h = im.size
+    if rows < h and im.format == "PNG" and not im.info.get("interlace"):
+        # Non-interlaced PNG rows come first in the zlib stream: decode a PNG of just
+        # those rows (see png_strips.head_png), or the whole image if that fails
+        from png_strips import head_png  # png_strips imports this module
+        try:
+            with Image.open(head_png(image, rows)) as head:
+                arr = _pixels(head, mode)
+            if arr.shape[:2] == (rows, w):
+                return arr
+        except (OSError, SyntaxError, ValueError, KeyError, zlib.error):
+            pass
+        im = _open(image)
+    return _pixels(im, mode)
+
+
+def save_png(arr: np.ndarray, output_image, info=None, output_format=None):
+    # output_format: encoder preset (see output_format.FORMATS), PIL's default PNG settings if None
+    output_format = parse_format(output_format)
+    im = Image.fromarray(arr, 'RGBA' if arr.shape[-1] == 4 else 'RGB')
+    if info:
+        # Keep what PIL would have carried over from the source image
+        im.info.update(info)
+    im.save(output_image, output_format.format, **output_format.save_options())
+
+
+def red_plane(arr: np.ndarray) -> np.ndarray:
+    """Writable 1-D view of the red channel in row-major pixel order."""
+    return arr.reshape(-1, arr.shape[-1])[:, 0]
+
+
+def embed_bits(plane: np.ndarray, bits: np.ndarray, offset: int = 0):
+    """Overwrite the LSBs of plane[offset:offset+len(bits)] in place."""
+    end = offset + len(bits)
+    if end > len(plane):
+        raise ValueError("Not enough carrier capacity")
+    region = plane[offset:end]
+    region &= 0xFE
+    region |= bits
+
+
+def extract_bits(plane: np.ndarray, count: int, offset: int = 0) -> np.ndarray:
+    """Read up to `count` LSBs starting at `offset` (shorter if the carrier ends)."""
+    return plane[offset:offset + count] & 1
+
+
+def _slot_view(arr: np.ndarray, layout: Layout) -> np.ndarray:
+    """Writable (pixels x channels) view of the payload slots that follow the layout header."""
+    return arr.reshape(-1, arr.shape[-1])[layout.header_pixels:, :layout.nchannels]
+
+
+def _slot_region(view: np.ndarray, first: int, count: int):
+    nch = view.shape[1]
+    p0, p1 = first // nch, -(-(first + count) // nch)
+    return view[p0:p1], first - p0 * nch
+
+
+def _read_slots(view: np.ndarray, first: int, count: int) -> np.ndarray:
+    region, start = _slot_region(view, first, count)
+    return region.reshape(-1)[start:start + count]
+
+
+def _write_slots(view: np.ndarray, first: int, values: np.ndarray, mask: int):
+    region, start = _slot_region(view, first, len(values))
+    flat = region.reshape(-1)  # a copy unless every channel is used
+    seg = flat[start:start + len(values)]
+    seg &= np.uint8(~mask & 0xFF)
+    seg |= values
+    region[...] = flat.reshape(region.shape)
+
+
+def pack_groups(bits: np.ndarray, k: int) -> np.ndarray:
+    """Fold consecutive groups of k bits (MSB first) into slot values; the last group is zero-padded."""
+    pad = -len(bits) % k
+    if pad:
+        bits = np.concatenate([bits, np.zeros(pad, dtype=np.uint8)])
+    weights = (1 << np.arange(k - 1, -1, -1)).astype(np.uint8)
+    return (bits.reshape(-1, k) * weights).sum(axis=1, dtype=np.uint8)
+
+
+def unpack_groups(values: np.ndarray, k: int) -> np.ndarray:
+    shifts = np.arange(k - 1, -1, -1, dtype=np.uint8)
+    return ((values[:, None] >> shifts) & 1).reshape(-1)
+
+
+def layout_permutation(layout: Layout, pixels: int, passphrase=None):
+    """Slot permutation for a scattered layout over a carrier of `pixels` pixels (None otherwise)."""
+    if layout.order != "scatter":
+        return None
+    if not passphrase:
+        raise ValueError("This carrier uses a scattered layout; a passphrase is required")
+    return Permutation(passphrase, layout.slots(pixels))
+
+
+def _scattered_slots(view: np.ndarray, perm, first: int, count: int):
+    """(pixel, channel) index arrays of payload slots first..first+count-1."""
+    return np.divmod(perm.range(first, first + count), view.shape[1])
+
+
+def _region_align(layout: Layout) -> int:
+    # Whole pixels per region, so threads never rewrite each other's pixels
+    return 1 if layout.is_default else layout.bits * layout.nchannels
+
+
+def embed_layout(arr: np.ndarray, layout: Layout, bits: np.ndarray, offset: int = 0, perm=None, workers=None):
+    """Write payload bits at payload bit `offset` using `layout`.
+
+    Payloads may be written in consecutive chunks; the layout header goes in with
+    the chunk at offset 0. For pixel and scatter order, chunk offsets must be
+    multiples of layout.bits. Scatter order needs perm (see layout_permutation).
+    With workers > 1 (default: STEGO_THREADS) large writes are split into
+    pixel-aligned regions written by threads; bit-plane order stays serial.
+    """
+    workers = parallel.resolve(workers)
+    if workers > 1 and layout.order != "plane":
+        regions = parallel.split(offset, offset + len(bits), _region_align(layout), workers)
+        if len(regions) > 1:
+            parallel.run(lambda r: embed_layout(arr, layout, bits[r[0] - offset:r[1] - offset], r[0], perm, 1),
+                         regions, workers)
+            return
+    if layout.is_default:
+        embed_bits(red_plane(arr), bits, offset)
+        return
+    if offset + len(bits) > layout.capacity(arr.shape[0] * arr.shape[1]):
+        raise ValueError("Not enough carrier capacity")
+    if offset == 0:
+        embed_bits(red_plane(arr), bytes_to_bits(layout.to_header()))
+    view = _slot_view(arr, layout)
+    k = layout.bits
+    if layout.order == "scatter":
+        if perm is None:
+            raise ValueError("A passphrase is required for scattered layouts")
+        if offset % k:
+            raise ValueError("Chunk offset must be a multiple of the bits per channel")
+        values = pack_groups(bits, k)
+        pixel, channel = _scattered_slots(view, perm, offset // k, len(values))
+        view[pixel, channel] = (view[pixel, channel] & np.uint8(~((1 << k) - 1) & 0xFF)) | values
+        return
+    if layout.order == "pixel":
+        if offset % k:
+            raise ValueError("Chunk offset must be a multiple of the bits per channel")
+        _write_slots(view, offset // k, pack_groups(bits, k), (1 << k) - 1)
+        return
+    slots = view.shape[0] * view.shape[1]
+    pos = 0
+    while pos < len(bits):
+        plane, slot = divmod(offset + pos, slots)
+        n = min(len(bits) - pos, slots - slot)
+        _write_slots(view, slot, bits[pos:pos + n] << plane, 1 << plane)
+        pos += n
+
+
+def extract_layout(arr: np.ndarray, layout: Layout, count: int, offset: int = 0, perm=None,
+                   workers=None) -> np.ndarray:
+    """Read up to `count` payload bits starting at payload bit `offset` (shorter if the carrier ends)."""
+    workers = parallel.resolve(workers)
+    if workers > 1 and layout.order != "plane":
+        end = min(offset + count, layout.capacity(arr.shape[0] * arr.shape[1]))
+        regions = parallel.split(offset, end, _region_align(layout), workers) if end > offset else []
+        if len(regions) > 1:
+            return np.concatenate(parallel.run(
+                lambda r: extract_layout(arr, layout, r[1] - r[0], r[0], perm, 1), regions, workers))
+    if layout.is_default:
+        return extract_bits(red_plane(arr), count, offset)
+    view = _slot_view(arr, layout)
+    slots = view.shape[0] * view.shape[1]
+    k = layout.bits
+    end = min(offset + count, slots * k)
+    if end <= offset:
+        return np.zeros(0, dtype=np.uint8)
+    if layout.order in ("pixel", "scatter"):
+        s0, s1 = offset // k, -(-end // k)
+        if layout.order == "scatter":
+            if perm is None:
+                raise ValueError("A passphrase is required for scattered layouts")
+            values = view[_scattered_slots(view, perm, s0, s1 - s0)]
+        else:
+            values = _read_slots(view, s0, s1 - s0)
+        bits = unpack_groups(values, k)
+        return bits[offset - s0 * k:end - s0 * k]
+    parts = []
+    pos = offset
+    while pos < end:
+        plane, slot = divmod(pos, slots)
+        n = min(end - pos, slots - slot)
+        parts.append((_read_slots(view, slot, n) >> plane) & 1)
+        pos += n
+    return np.concatenate(parts)
+
+
+def read_layout(arr: np.ndarray) -> Layout:
+    """Detect the layout of a carrier from its header (default layout when there is none)."""
+    head = bits_to_bytes(extract_bits(red_plane(arr), HEADER_BITS))
+    return Layout.from_header(head) or DEFAULT_LAYOUT
+
+
+class ImageLSBReader:
+    """Payload bit reader that decodes only as many rows as the requested bits need.
+
+    The layout is detected from the carrier header; bit-plane ordered and
+    scattered layouts spread the payload over the whole image and therefore
+    decode it fully. Scattered layouts need the embedding passphrase (checked
+    on the first read, so the layout of any carrier can be inspected).
+    """
+
+    def __init__(self, image, passphrase=None, workers=None):
+        self.workers = workers
+        self.image = image
+        if hasattr(image, "seek"):
+            image.seek(0)
+        with Image.open(image) as im:
+            self.width, self.height = im.size
+        self._arr = None
+        self._mode = 'RGB'
+        self._ensure_pixels(HEADER_BITS)
+        self.layout = read_layout(self._arr)
+        if self.layout.mode != self._mode:
+            self._mode = self.layout.mode
+            self._arr = None
+        self.capacity = self.layout.capacity(self.width * self.height)
+        self._passphrase = passphrase
+        self._perm = None
+
+    @property
+    def needs_passphrase(self) -> bool:
+        """True for a scattered carrier opened without a passphrase."""
+        return self.layout.order == "scatter" and not self._passphrase
+
+    def _ensure_pixels(self, pixels: int):
+        need = min(self.height, -(-pixels // self.width))
+        loaded = 0 if self._arr is None else len(self._arr)
+        if need > loaded:
+            # Grow geometrically so a header read followed by the payload read
+            # costs at most a couple of partial decodes.
+            self._arr = load_rows(self.image, min(self.height, max(need, 2 * loaded)), self._mode)
+
+    def read_bits(self, count: int, offset: int = 0) -> np.ndarray:
+        layout = self.layout
+        end = min(offset + count, self.capacity)
+        if layout.order == "scatter" and self._perm is None:
+            self._perm = layout_permutation(layout, self.width * self.height, self._passphrase)
+        if layout.order != "pixel":
+            self._ensure_pixels(self.width * self.height)
+        else:
+            slots = -(-end // layout.bits)
+            self._ensure_pixels(layout.header_pixels + -(-slots // layout.nchannels))
+        return extract_layout(self._arr, layout, count, offset, self._perm, self.workers)
@@ -0,0 +1,184 @@
+# capacity.py
+# Carrier capacity from headers only: PIL's lazy image open for pictures, the
+# WAV header, soundfile metadata or ffprobe for audio. No pixels or samples
+# are decoded, so an oversized payload is rejected before any real work starts.
+import math
+import os
+import subprocess
+import wave
+from pathlib import Path
+
+from layout import PRESETS, parse_layout
+from audio_layout import PRESETS as AUDIO_PRESETS, parse_audio_layout
+from container import CHUNK_SIZE
+from carrier_cache import LRUCache, file_digest
+
+FFPROBE = os.environ.get("STEGO_FFPROBE", "ffprobe")
+CACHE_ENTRIES = 4096
+DURATION_SLACK = 0.1  # seconds added to ffprobe durations
+
+_cache = LRUCache(CACHE_ENTRIES, sizeof=lambda info: 1)
+
+
+def _rewind(src):
+    if hasattr(src, "seek"):
+        src.seek(0)
+
+
+def image_capacity(src) -> dict:
+    """Payload bytes per layout preset from the image header."""
+    from PIL import Image
+    _rewind(src)
+    with Image.open(src) as im:
+        w, h = im.size
+    _rewind(src)
+    return {
+        "medium": "image", "width": w, "height": h, "estimated": False,
+        "capacity": {key: layout.capacity(w * h) // 8 for key, layout in PRESETS.items()},
+    }
+
+
+def _probe_soundfile(src):
+    try:
+        import soundfile
+    except ImportError:
+        return None
+    _rewind(src)
+    try:
+        info = soundfile.info(src if hasattr(src, "read") else str(src))
+    except RuntimeError:
+        return None
+    # The soundfile decoder keeps the native rate and channel count, as int16
+    return info.frames, info.channels, 2, False
+
+
+def _probe_ffprobe(src):
+    from transcode import RATE, CHANNELS, SAMPWIDTH, ffmpeg_input  # NumPy, loaded on first use (see warm.py)
+    try:
+        # Input handed over the same way as for the ffmpeg decode
+        with ffmpeg_input(src) as (source, stdin):
+            proc = subprocess.run([
+                FFPROBE, "-v", "error", "-show_entries", "format=duration",
+                "-of", "default=noprint_wrappers=1:nokey=1", source
+            ], stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        return None
+    try:
+        duration = float(proc.stdout.decode().strip())
+    except ValueError:
+        return None
+    # ffmpeg decodes to RATE/CHANNELS/SAMPWIDTH. The duration is rounded and decoders
+    # pad a little, so round up by DURATION_SLACK: the preflight must never reject a
+    # payload that fits (the exact check after decoding catches the rest).
+    return math.ceil((duration + DURATION_SLACK) * RATE), CHANNELS, SAMPWIDTH, True
+
+
+def audio_capacity(src) -> dict:
+    """Payload bytes per format/sample layout preset from an audio header; None capacity if it cannot be probed."""
+    from audio_engine import open_wav  # NumPy, loaded on first use (see warm.py)
+    probe = None
+    try:
+        with open_wav(src) as wav:
+            probe = wav.getnframes(), wav.getnchannels(), wav.getsampwidth(), False
+    except (wave.Error, EOFError):
+        for prober in (_probe_soundfile, _probe_ffprobe):
+            probe = prober(src)
+            if probe is not None:
+                break
+    _rewind(src)
+    if probe is None:
+        return {"medium": "audio", "frames": None, "channels": None, "estimated": True, "capacity": None}
+    frames, channels, sampwidth, estimated = probe
+    # "lsb": one payload bit per frame byte (the original format); presets: low bits per sample
+    capacity = {"lsb": frames * channels * sampwidth // 8}
+    capacity.update({key: layout.capacity(frames, channels) // 8 for key, layout in AUDIO_PRESETS.items()})
+    return {"medium": "audio", "frames": frames, "channels": channels, "estimated": estimated, "capacity": capacity}
+
+
+def lookup(digest: str):
+    """Cached capacity info for a carrier SHA-256, or None."""
+    return _cache.get(digest)
+
+
+def carrier_capacity(src, medium: str, cache: bool = True) -> dict:
+    """Capacity info for a carrier path or file object, cached by content hash.
+
+    Hashing reads the whole file, so cache=False is cheaper when the header is
+    all that is needed and no ffprobe run is at stake.
+    """
+    digest = file_digest(src) if cache else None
+    if digest is not None:
+        info = lookup(digest)
+        if info is not None:
+            return info
+    info = image_capacity(src) if medium == "image" else audio_capacity(src)
+    if digest is not None:
+        info["sha256"] = digest
+        _cache.put(digest, info)
+    return info
+
+
+def required_bytes(medium: str, payload_type: str, size: int, name: str = "", compression=None):
+    """Carrier bytes a payload of `size` bytes occupies, or None if compression makes it unknown.
+
+    For text, size is the number of characters (legacy formats) or UTF-8 bytes (containers).
+    """
+    if compression in ("zlib", "lzma"):
+        return None
+    if compression == "none":
+        # STG2: header, per-chunk length + CRC32, terminator
+        return 11 + len(name.encode("utf-8")) + 8 * math.ceil(size / CHUNK_SIZE) + 8 + size
+    if payload_type == "text":
+        from audio_engine import DELIMITER
+        return size + (4 if medium == "image" else len(DELIMITER))
+    # STG1: magic, name length, name, payload length
+    return 10 + len(name.encode("utf-8")) + size
+
+
+def check_fits(spec: dict):
+    """Preflight for a task spec (see tasks.run_task). Returns an error message or None."""
+    if spec["action"] != "encode":
+        return None
+    medium = spec["medium"]
+    compression = spec.get("compression")
+    if spec["payload_type"] == "text":
+        text = spec["message"]
+        size = len(text) if compression is None else len(text.encode("utf-8"))
+        needed = required_bytes(medium, "text", size, compression=compression)
+    else:
+        payload = spec["payload"]
+        if hasattr(payload, "seek"):
+            payload.seek(0, os.SEEK_END)
+            size = payload.tell()
+            payload.seek(0)
+        else:
+            size = os.path.getsize(payload)
+        needed = required_bytes(medium, "file", size, spec["payload_name"], compression)
+    if needed is None:
+        return None
+
+    upload = spec["upload"]
+    if medium == "image":
+        info = carrier_capacity(upload, "image", cache=False)
+        layout = parse_layout(spec.get("layout"))
+        if spec.get("passphrase"):
+            layout = layout.scattered()
+        available = layout.capacity(info["width"] * info["height"]) // 8
+        what = "image"
+    else:
+        # Only lossy/compressed audio needs an ffprobe run, which is worth caching
+        is_wav = Path(spec["upload_name"]).suffix.lower() == ".wav"
+        info = carrier_capacity(upload, "audio", cache=not is_wav)
+        if info["capacity"] is None:
+            return None  # no probe available, the exact check after decoding still runs
+        layout = parse_audio_layout(spec.get("layout"))
+        if layout is None:
+            available = info["capacity"]["lsb"]
+        else:
+            if spec.get("passphrase"):
+                layout = layout.scattered()
+            available = layout.capacity(info["frames"], info["channels"]) // 8
+        what = "audio"
+    if needed > available:
+        return f"Payload too large for this {what} ({needed} bytes needed, {available} available)."
+    return None
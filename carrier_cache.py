@@ -0,0 +1,123 @@
+# carrier_cache.py
+# Content-addressed LRU caches for decoded carriers, so embedding different
+# payloads into the same stock image or audio bed decodes it only once, plus
+# TTL cleanup of per-request output directories. Sizes come from the environment:
+#  STEGO_IMAGE_CACHE_MB  decoded image arrays, per process (0 disables)
+#  STEGO_PCM_CACHE_MB    decoded PCM WAV buffers, per process (0 disables)
+# Caches live per process: every job-queue worker has its own. Unset, each cache
+# gets DEFAULT_CACHE_MB split over the STEGO_WORKERS workers (default: CPU count),
+# at least MIN_CACHE_MB, so a pool's total stays near DEFAULT_CACHE_MB per cache.
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+def file_digest(src) -> str:
+    """SHA-256 of a file path or (rewound) binary file object."""
+    h = hashlib.sha256()
+    if hasattr(src, "read"):
+        src.seek(0)
+        for block in iter(lambda: src.read(1024 * 1024), b""):
+            h.update(block)
+        src.seek(0)
+        return h.hexdigest()
+    with open(src, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class LRUCache:
+    """Thread-safe LRU mapping bounded by the total size of its values."""
+
+    def __init__(self, max_bytes: int, sizeof=len):
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = value
+            self._size += size
+            while self._size > self.max_bytes:
+                _, old = self._items.popitem(last=False)
+                self._size -= self._sizeof(old)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+
+_MB = 1024 * 1024
+DEFAULT_CACHE_MB = 256
+MIN_CACHE_MB = 16
+
+
+def _cache_bytes(variable: str) -> int:
+    if os.environ.get(variable):
+        return int(os.environ[variable]) * _MB
+    workers = int(os.environ.get("STEGO_WORKERS", "0")) or os.cpu_count() or 1
+    return max(MIN_CACHE_MB, DEFAULT_CACHE_MB // workers) * _MB
+
+
+# (read-only array, PIL info) per (digest, mode)
+IMAGE_CACHE = LRUCache(_cache_bytes("STEGO_IMAGE_CACHE_MB"), sizeof=lambda v: v[0].nbytes)
+# in-memory WAV bytes per digest
+PCM_CACHE = LRUCache(_cache_bytes("STEGO_PCM_CACHE_MB"))
+
+
+def prune_expired(root: Path, ttl: float, keep=()) -> int:
+    """Delete entries directly under root not modified for ttl seconds, except names in keep.
+
+    Returns the number of entries removed.
+    """
+    cutoff = time.time() - ttl
+    removed = 0
+    try:
+        entries = list(Path(root).iterdir())
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if entry.name in keep:
+            continue
+        try:
+            if entry.stat().st_mtime >= cutoff:
+                continue
+            if entry.is_dir():
+                shutil.rmtree(entry)
+            else:
+                entry.unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass  # removed concurrently
+    return removed
@@ -0,0 +1,148 @@
+# container.py
+# Version-2 payload container with optional compression and per-chunk CRC32.
+# Layout (all integers big-endian):
+#  MAGIC(4 bytes = b'STG2') | flags(1) | name_len(2) | name UTF-8 | chunk_size(4)
+#  chunk*: stored_len(4) | crc32(4) of the stored bytes | stored bytes
+#  end:    stored_len(4) = 0 | crc32(4) = 0
+# flags: bits 0-1 compression (0 none, 1 zlib, 2 lzma), bit 2 text payload.
+# Each chunk is compressed on its own, so packing and unpacking stream and a
+# corrupted chunk is reported by number instead of producing garbage output.
+import io
+import lzma
+import tempfile
+import zlib
+
+MAGIC2 = b"STG2"
+COMPRESSION = ("none", "zlib", "lzma")
+FLAG_TEXT = 0x04
+CHUNK_SIZE = 256 * 1024
+SPOOL_BYTES = 8 * 1024 * 1024  # packed containers larger than this spill to a temp file
+
+
+class ContainerError(ValueError):
+    pass
+
+
+def _compress(kind: str, raw: bytes) -> bytes:
+    if kind == "zlib":
+        return zlib.compress(raw, 6)
+    if kind == "lzma":
+        return lzma.compress(raw)
+    return raw
+
+
+def _decompress(kind: str, stored: bytes) -> bytes:
+    try:
+        if kind == "zlib":
+            return zlib.decompress(stored)
+        if kind == "lzma":
+            return lzma.decompress(stored)
+    except (zlib.error, lzma.LZMAError) as exc:
+        raise ContainerError(f"Payload chunk could not be decompressed: {exc}") from None
+    return stored
+
+
+def pack(stream, name: str = "", compression: str = "zlib", text: bool = False, chunk_size: int = CHUNK_SIZE):
+    """Pack a readable binary stream into a container. Returns (spooled file at offset 0, size)."""
+    if compression not in COMPRESSION:
+        raise ValueError(f"Compression must be one of {', '.join(COMPRESSION)}")
+    name_bytes = name.encode("utf-8")
+    if len(name_bytes) > 65535:
+        raise ValueError("Filename too long to embed")
+    flags = COMPRESSION.index(compression) | (FLAG_TEXT if text else 0)
+    out = tempfile.SpooledTemporaryFile(SPOOL_BYTES)
+    out.write(MAGIC2 + bytes([flags]) + len(name_bytes).to_bytes(2, "big") + name_bytes
+              + chunk_size.to_bytes(4, "big"))
+    while True:
+        raw = stream.read(chunk_size)
+        if not raw:
+            break
+        stored = _compress(compression, raw)
+        out.write(len(stored).to_bytes(4, "big") + zlib.crc32(stored).to_bytes(4, "big") + stored)
+    out.write(bytes(8))
+    size = out.tell()
+    out.seek(0)
+    return out, size
+
+
+def pack_text(message: str, compression: str = "zlib") -> bytes:
+    packed, _ = pack(io.BytesIO(message.encode("utf-8")), compression=compression, text=True)
+    with packed:
+        return packed.read()
+
+
+def _read_bytes(read_bits, count: int, offset: int) -> bytes:
+    from bitplane import bits_to_bytes  # NumPy/PIL only once bits are read (see warm.py)
+    data = bits_to_bytes(read_bits(count * 8, offset=offset * 8))
+    if len(data) < count:
+        raise ContainerError("Payload is truncated (carrier too short)")
+    return data
+
+
+def read_header(read_bits) -> dict:
+    """Parse and validate the container header via read_bits(count, offset).
+
+    Raises ContainerError if it is absent or not one pack() writes, e.g. for
+    legacy text that merely starts with the magic bytes.
+    """
+    head = _read_bytes(read_bits, 7, 0)
+    if head[:4] != MAGIC2:
+        raise ContainerError("No version-2 payload container found")
+    flags = head[4]
+    if flags & ~(0x03 | FLAG_TEXT):
+        raise ContainerError("Unknown payload container flags")
+    if flags & 0x03 >= len(COMPRESSION):
+        raise ContainerError("Unknown payload compression")
+    name_len = int.from_bytes(head[5:7], "big")
+    rest = _read_bytes(read_bits, name_len + 4, 7)
+    try:
+        name = rest[:name_len].decode("utf-8")
+    except UnicodeDecodeError:
+        raise ContainerError("Payload name is not valid UTF-8") from None
+    chunk_size = int.from_bytes(rest[name_len:], "big")
+    if not chunk_size:
+        raise ContainerError("Payload container has no chunk size")
+    return {
+        "name": name,
+        "compression": COMPRESSION[flags & 0x03],
+        "text": bool(flags & FLAG_TEXT),
+        "chunk_size": chunk_size,
+        "data_offset": 7 + name_len + 4,
+    }
+
+
+def read_chunks(read_bits, header: dict, sink) -> int:
+    """Verify and unpack every chunk into sink (a writable binary file). Returns bytes written."""
+    # Stored chunks can be a little larger than raw ones; anything bigger is a corrupt length
+    max_stored = header["chunk_size"] + header["chunk_size"] // 8 + 1024
+    pos = header["data_offset"]
+    written = 0
+    index = 0
+    while True:
+        record = _read_bytes(read_bits, 8, pos)
+        pos += 8
+        stored_len = int.from_bytes(record[:4], "big")
+        if stored_len == 0:
+            return written
+        if stored_len > max_stored:
+            raise ContainerError(f"Payload chunk {index} has a corrupt length")
+        stored = _read_bytes(read_bits, stored_len, pos)
+        pos += stored_len
+        if zlib.crc32(stored) != int.from_bytes(record[4:], "big"):
+            raise ContainerError(f"Payload chunk {index} failed its CRC32 check (carrier modified or corrupted)")
+        written += sink.write(_decompress(header["compression"], stored))
+        index += 1
+
+
+def has_container(read_bits) -> bool:
+    from bitplane import bits_to_bytes
+    return bits_to_bytes(read_bits(32)) == MAGIC2
+
+
+def unpack_text(read_bits, header: dict = None) -> str:
+    header = header or read_header(read_bits)
+    if not header["text"]:
+        raise ContainerError("Carrier holds a file payload, not text")
+    buf = io.BytesIO()
+    read_chunks(read_bits, header, buf)
+    return buf.getvalue().decode("utf-8", errors="replace")
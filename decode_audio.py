@@ -1,23 +1,19 @@
-import wave
+from audio_engine import extract_text, WavLSBReader
+from container import ContainerError, read_header, unpack_text
+from metrics import stage
 
-def decode_audio(stego_file):
-    audio = wave.open(stego_file, 'rb')
-    frame_bytes = bytearray(list(audio.readframes(audio.getnframes())))
-    audio.close()
-
-    # Extract LSBs
-    bits = [str(byte & 1) for byte in frame_bytes]
-    message = ""
-    for i in range(0, len(bits), 8):
-        byte = bits[i:i+8]
-        if len(byte) < 8:
-            break
-        char = chr(int("".join(byte), 2))
-        message += char
-        if message.endswith("###"):
-            break
-
-    return message.replace("###", "")
+def decode_audio(stego_file, passphrase=None):
+    # passphrase: needed if the message was scattered with one
+    with stage("extract"):
+        with WavLSBReader(stego_file, passphrase) as reader:
+            try:
+                header = read_header(reader.read_bits)
+            except ContainerError:
+                header = None  # no container, or "###"-terminated text that starts with its magic
+            if header is not None:
+                return unpack_text(reader.read_bits, header)
+        # Extract LSBs and stop reading at the "###" delimiter
+        return extract_text(stego_file, passphrase=passphrase)
 
 if __name__ == "__main__":
     stego_audio = input("Enter stego WAV file path: ").strip()
@@ -1,55 +1,29 @@
 # extract_image.py
-from PIL import Image
+from bitplane import ImageLSBReader, bits_to_bytes, bits_to_int, bytes_to_text
+from container import has_container, unpack_text
+from metrics import stage
 
 def bits_to_str(bits):
-    chars = []
-    for b in range(0, len(bits), 8):
-        byte = 0
-        for i in range(8):
-            byte = (byte << 1) | bits[b + i]
-        chars.append(chr(byte))
-    return ''.join(chars)
+    return bytes_to_text(bits_to_bytes(bits[:len(bits) - len(bits) % 8]))
 
-def extract(input_image):
-    im = Image.open(input_image)
-    if im.mode != 'RGB':
-        im = im.convert('RGB')
-    w, h = im.size
-    pixels = im.load()
-    
-    # Step 1: extract first 32 bits to get message length
-    length_bits = []
-    idx = 0
-    for y in range(h):
-        for x in range(w):
-            r, g, b = pixels[x, y]
-            length_bits.append(r & 1)
-            idx += 1
-            if idx >= 32:
-                break
-        if idx >= 32:
-            break
-    
-    length = 0
-    for bit in length_bits:
-        length = (length << 1) | bit
-    
-    # Step 2: extract message bits
-    message_bits = []
-    count = 0
-    for y in range(h):
-        for x in range(w):
-            if count < 32:
-                count += 1  # skip first 32 bits
-                continue
-            if len(message_bits) >= length:
-                break
-            r, g, b = pixels[x, y]
-            message_bits.append(r & 1)
-        if len(message_bits) >= length:
-            break
-    
-    message = bits_to_str(message_bits)
+def extract(input_image, passphrase=None, workers=None):
+    # Only the rows holding the length header and the message are decoded
+    # (scattered carriers are decoded whole and need the embedding passphrase)
+    with stage("decode"):
+        reader = ImageLSBReader(input_image, passphrase, workers)
+
+    with stage("extract"):
+        if has_container(reader.read_bits):
+            # STG2 text container (CRC-checked, possibly compressed)
+            message = unpack_text(reader.read_bits)
+        else:
+            # Step 1: extract first 32 bits to get message length
+            length = bits_to_int(reader.read_bits(32))
+
+            # Step 2: extract message bits
+            message_bits = reader.read_bits(length, offset=32)
+
+            message = bits_to_str(message_bits)
     print("Hidden message:", message)
     return message
 
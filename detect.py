@@ -0,0 +1,240 @@
+# detect.py
+# Quick stego detection: identifies the payload a carrier holds from its first
+# few hundred payload bits (layout headers, STG1/STG2 magic and length fields,
+# the start of a text message) without extracting anything. Only the rows or
+# frames those bits live in are read, so a scan runs at about disk-read speed.
+#
+#   python detect.py incoming/                    # report carriers holding payloads
+#   python detect.py "inbox/**/*.png" --all --report scan.jsonl --workers 8
+#
+# Results: {"path", "medium", "payload" ("file" | "text" | None), "format"
+# ("STG1" | "STG2" | "text" | None), "layout", "locked", "verified", "name",
+# "size", "error"}. "locked" marks scattered carriers opened without their
+# passphrase. Text in the original audio format has no header or length field
+# and may hold any byte, so it is verified only by its delimiter within the
+# first TEXT_WINDOW bytes; other audio without a header is reported as
+# unverified text, which decoding settles with a capped read (see
+# audio_engine.extract_text). Carriers scattered in the original audio format
+# cannot be told apart from clean audio without the passphrase.
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from media import AUDIO_EXTS, IMAGE_EXTS
+from warm import pool_options
+
+TEXT_WINDOW = 4096  # leading bytes of a carrier searched for the audio text delimiter
+
+
+def _sniff_medium(src, name=None) -> str:
+    suffix = Path(name or (src if not hasattr(src, "read") else "")).suffix.lower()
+    if suffix in AUDIO_EXTS:
+        return "audio"
+    if suffix in IMAGE_EXTS:
+        return "image"
+    if hasattr(src, "read"):
+        src.seek(0)
+        head = src.read(12)
+        src.seek(0)
+    else:
+        with open(src, "rb") as f:
+            head = f.read(12)
+    return "audio" if head[:4] == b"RIFF" and head[8:12] == b"WAVE" else "image"
+
+
+def _classify(read_bits, capacity: int, medium: str) -> dict:
+    """Payload fields for a carrier whose payload bits are read via read_bits(count, offset)."""
+    from bitplane import bits_to_bytes
+    from container import MAGIC2, ContainerError, read_header
+    from stego_files import MAGIC
+    from audio_engine import DELIMITER
+
+    head = bits_to_bytes(read_bits(48))
+    if len(head) < 6:
+        return {}
+    header = None
+    if head[:4] == MAGIC2:
+        try:
+            header = read_header(read_bits)
+        except ContainerError:
+            if medium == "image":
+                return {}
+            # audio text has no length prefix, so it may start with the magic: classify it as text below
+    if header is not None:
+        return {"payload": "text" if header["text"] else "file", "format": "STG2",
+                "name": header["name"] or None, "compression": header["compression"]}
+    if head[:4] == MAGIC:
+        name_len = int.from_bytes(head[4:6], "big")
+        if 48 + name_len * 8 + 32 > capacity:
+            return {}
+        rest = bits_to_bytes(read_bits(name_len * 8 + 32, offset=48))
+        size = int.from_bytes(rest[name_len:], "big")
+        if 48 + (name_len + 4 + size) * 8 > capacity:
+            return {}
+        try:
+            name = rest[:name_len].decode("utf-8")
+        except UnicodeDecodeError:
+            return {}
+        return {"payload": "file", "format": "STG1", "name": name, "size": size}
+    if medium == "image":
+        # 32-bit message length in bits: a non-empty run of whole bytes that fits the carrier.
+        # Message bytes may take any value (low byte of each character), so they are not checked.
+        length = int.from_bytes(head[:4], "big")
+        if length == 0 or length % 8 or length > capacity - 32:
+            return {}
+        return {"payload": "text", "format": "text", "size": length // 8}
+    # Audio text ends at the delimiter and any byte may precede it
+    marker = DELIMITER.encode("latin-1")
+    window = bits_to_bytes(read_bits((TEXT_WINDOW + len(marker)) * 8))
+    end = window.find(marker)
+    if end >= 0:
+        return {"payload": "text", "format": "text", "size": end}
+    if len(window) < TEXT_WINDOW + len(marker):
+        return {}  # carrier ended without a delimiter
+    return {"payload": "text", "format": "text", "verified": False}  # longer message, or none
+
+
+def detect(src, medium=None, passphrase=None, name=None) -> dict:
+    """Identify the payload in a carrier (path or binary file object) without extracting it.
+
+    medium ("image" | "audio") is guessed from name/the path suffix or the file
+    header when not given. A passphrase is needed to look inside scattered carriers.
+    """
+    medium = medium or _sniff_medium(src, name)
+    info = {"medium": medium, "payload": None, "format": None, "layout": None, "locked": False,
+            "verified": None, "name": None, "size": None}
+    if medium == "image":
+        from PIL import Image
+        from bitplane import ImageLSBReader
+        if hasattr(src, "seek"):
+            src.seek(0)
+        with Image.open(src) as im:
+            lossy = im.format == "JPEG"
+        if lossy:
+            return info  # LSB payloads do not survive JPEG; stego images are never JPEGs
+        reader = ImageLSBReader(src, passphrase)
+        if not reader.layout.is_default:
+            layout = reader.layout
+            info["layout"] = f"{layout.channels}:{layout.bits}:{layout.order}"
+        if reader.needs_passphrase:
+            info["locked"] = True
+        else:
+            info.update(_classify(reader.read_bits, reader.capacity, "image"))
+    else:
+        import wave
+        from audio_engine import WavLSBReader
+        try:
+            reader = WavLSBReader(src, passphrase)
+        except (wave.Error, EOFError):
+            return info  # not a PCM WAV: stego audio is always WAV
+        with reader:
+            if reader.layout is not None:
+                layout = reader.layout
+                channels = ",".join(map(str, layout.channels)) or "all"
+                info["layout"] = f"{layout.bits}:{channels}:{layout.order}"
+            if reader.needs_passphrase:
+                info["locked"] = True
+            else:
+                info.update(_classify(reader.read_bits, reader.capacity, "audio"))
+    if info["payload"] is not None and info["verified"] is None:
+        info["verified"] = True
+    if hasattr(src, "seek"):
+        src.seek(0)
+    return info
+
+
+def payload_kind(src, medium=None, passphrase=None) -> str:
+    """"file" or "text" for the payload in a carrier; ValueError when there is none to read.
+
+    Unverified audio text is "text": extract_text finds out, within its read limit.
+    """
+    info = detect(src, medium, passphrase)
+    if info["locked"]:
+        raise ValueError("This carrier is scattered; enter the passphrase used to embed it.")
+    if info["payload"] is None:
+        raise ValueError(f"No hidden data found in this {info['medium']}.")
+    return info["payload"]
+
+
+# ------------------------------
+# Batch scan
+
+def _scan_one(path: str, passphrase=None) -> dict:
+    start = time.perf_counter()
+    try:
+        info = detect(path, passphrase=passphrase)
+        info["error"] = None
+    except Exception as exc:
+        info = {"medium": None, "payload": None, "error": f"{type(exc).__name__}: {exc}"}
+    info["path"] = path
+    info["seconds"] = time.perf_counter() - start
+    return info
+
+
+def iter_media(targets) -> list:
+    """Media files under the given files, directories (recursive) and glob patterns."""
+    found = []
+    for target in targets:
+        paths = [target] if os.path.exists(target) else sorted(glob.glob(target, recursive=True))
+        for path in paths:
+            if os.path.isdir(path):
+                for root, _, files in os.walk(path):
+                    found.extend(os.path.join(root, f) for f in sorted(files))
+            else:
+                found.append(path)
+    return [p for p in found if Path(p).suffix.lower() in IMAGE_EXTS | AUDIO_EXTS]
+
+
+def scan(paths: list, passphrase=None, workers=None) -> list:
+    """Detection results for every path, in order (process pool for more than one worker)."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) < 2:
+        return [_scan_one(p, passphrase) for p in paths]
+    with ProcessPoolExecutor(max_workers=workers, **pool_options()) as pool:
+        return list(pool.map(_scan_one, paths, [passphrase] * len(paths), chunksize=8))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detect steganographic payloads in media files")
+    parser.add_argument("targets", nargs="+", help="files, directories or glob patterns")
+    parser.add_argument("--passphrase", help="look inside carriers scattered with this passphrase")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--all", action="store_true",
+                        help="also list files without a payload or with unverified audio text")
+    parser.add_argument("--report", help="write per-file results as JSONL here")
+    args = parser.parse_args(argv)
+
+    paths = iter_media(args.targets)
+    if not paths:
+        parser.error("no media files found")
+    start = time.perf_counter()
+    results = scan(paths, args.passphrase, args.workers)
+    elapsed = time.perf_counter() - start
+    for r in results:
+        if r["error"]:
+            print(f"{r['path']}: error: {r['error']}")
+        elif (r["payload"] and r["verified"]) or r.get("locked") or args.all:
+            what = "locked (passphrase needed)" if r["locked"] else f"{r['payload'] or 'none'}"
+            if r["payload"] and not r["verified"]:
+                what += " (unverified: no delimiter near the start)"
+            detail = " ".join(f"{k}={r[k]}" for k in ("format", "name", "size", "layout") if r.get(k) is not None)
+            print(f"{r['path']}: {what} {detail}".rstrip())
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps(r) + "\n")
+    carrying = sum(1 for r in results if (r["payload"] and r["verified"]) or r.get("locked"))
+    unverified = sum(1 for r in results if r["payload"] and not r.get("verified"))
+    failed = sum(1 for r in results if r["error"])
+    print(f"{carrying}/{len(results)} carry payloads, {unverified} unverified, {failed} errors in {elapsed:.2f}s "
+          f"({len(results) / elapsed if elapsed else 0:.1f} files/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
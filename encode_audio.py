@@ -1,55 +1,76 @@
-import subprocess
-import wave
-import os
+import shutil
 from pathlib import Path
 
+from audio_engine import wav_capacity, embed_stream, scatter_permutation, DELIMITER
+from bitplane import text_to_bytes
+from transcode import open_pcm, needs_reencode, encode_from_wav
+from container import pack_text
+from audio_layout import parse_audio_layout
+from metrics import stage
+
 def convert_to_wav(input_file, temp_wav="temp.wav"):
-    """Convert any audio format to WAV using FFmpeg"""
-    subprocess.run([
-        "ffmpeg", "-y", "-i", input_file,
-        "-ar", "44100", "-ac", "2", "-sample_fmt", "s16", temp_wav
-    ], stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    """Convert any audio format to a WAV file (no ffmpeg run for PCM WAV input)"""
+    src = open_pcm(input_file)
+    if isinstance(src, str):
+        if Path(src).resolve() != Path(temp_wav).resolve():
+            shutil.copyfile(src, temp_wav)
+    else:
+        with open(temp_wav, "wb") as f:
+            shutil.copyfileobj(src, f)
     return temp_wav
 
-def encode_audio(input_file, secret_msg):
-    input_path = Path(input_file)
-    temp_wav = "temp.wav"
+def encode_audio(input_file, secret_msg, output_dir=None, stego_file=None, name=None, compression=None,
+                 passphrase=None, workers=None, layout=None):
+    """Hide secret_msg in input_file (a path, or a binary file object plus its file name).
 
-    # Convert to WAV
-    convert_to_wav(input_file, temp_wav)
+    Outputs go to output_dir (default: current directory) as <stem>_stego.wav,
+    plus <stem>_stego<ext> for lossy inputs. stego_file overrides the WAV target
+    and may be a path or a writable binary file object (no listening copy then).
+    compression ("none", "zlib", "lzma") stores an STG2 container instead of the
+    "###"-terminated text. A passphrase scatters the bits over the whole file.
+    workers sets the embedding threads (default: STEGO_THREADS).
+    layout (e.g. "s2", see audio_layout.PRESETS) embeds into the low bits of
+    each sample instead of every raw byte; None keeps the original format.
+    No temp files and no working-directory changes, so concurrent calls are safe.
+    Returns (stego WAV target, listening copy path or the WAV target).
+    """
+    input_path = Path(name or input_file)
+    layout = parse_audio_layout(layout)
+    if layout is not None and passphrase:
+        layout = layout.scattered()
+    output_dir = Path(output_dir) if output_dir is not None else Path()
 
-    # Read WAV
-    audio = wave.open(temp_wav, 'rb')
-    frame_bytes = bytearray(list(audio.readframes(audio.getnframes())))
-    params = audio.getparams()
-    audio.close()
+    # Decode to a PCM WAV, spooled to disk when large (PCM WAV input is read in place)
+    with stage("decode"):
+        pcm = open_pcm(input_file)
 
-    # Add delimiter
-    secret_msg += '###'
-    bits = ''.join([format(ord(c), '08b') for c in secret_msg])
+    if compression is None:
+        # Add delimiter
+        secret_msg += DELIMITER
+        data = text_to_bytes(secret_msg)
+    else:
+        data = pack_text(secret_msg, compression)
 
-    if len(bits) > len(frame_bytes):
+    if len(data) * 8 > wav_capacity(pcm, layout):
         raise ValueError("Message too long for this audio!")
 
-    # LSB encoding
-    for i, bit in enumerate(bits):
-        frame_bytes[i] = (frame_bytes[i] & 254) | int(bit)
-
-    # Save stego WAV
-    stego_file = input_path.stem + "_stego.wav"
-    stego = wave.open(stego_file, 'wb')
-    stego.setparams(params)
-    stego.writeframes(frame_bytes)
-    stego.close()
-
-    # Optional: convert back to original format for listening
-    output_file = input_path.stem + "_stego" + input_path.suffix
-    subprocess.run([
-        "ffmpeg", "-y", "-i", stego_file, output_file
-    ], stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
-
-    print(f"[+] Message encoded in '{stego_file}' (WAV) and '{output_file}' for listening")
-    os.remove(temp_wav)
+    # LSB encoding, streamed chunk by chunk into the stego WAV
+    if stego_file is None:
+        stego_file = output_dir / (input_path.stem + "_stego.wav")
+    with stage("embed"):
+        embed_stream(pcm, stego_file, data, perm=scatter_permutation(pcm, passphrase, layout), workers=workers,
+                     layout=layout)
+
+    # Optional: convert back to original format for listening (lossless inputs need no copy)
+    output_file = stego_file
+    if needs_reencode(input_path) and not hasattr(stego_file, "write"):
+        output_file = Path(stego_file).with_name(input_path.stem + "_stego" + input_path.suffix)
+        with stage("transcode"):
+            encode_from_wav(stego_file, output_file)
+
+    if not hasattr(stego_file, "write"):
+        print(f"[+] Message encoded in '{stego_file}' (WAV) and '{output_file}' for listening")
+    return stego_file, output_file
 
 if __name__ == "__main__":
     input_audio = input("Enter audio file path (any format): ").strip()
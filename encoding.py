@@ -1,40 +1,45 @@
 # embed_image.py
-from PIL import Image
+import numpy as np
+
+from bitplane import embed_layout, layout_permutation, bytes_to_bits, int_to_bits, text_to_bytes
+from layout import parse_layout
+from container import pack_text
+from png_strips import ImageCarrier
+from metrics import stage
 
 def str_to_bits(s):
-    b = []
-    for ch in s:
-        byte = ord(ch)
-        for i in range(8):
-            b.append((byte >> (7-i)) & 1)
-    return b
+    return bytes_to_bits(text_to_bytes(s))
 
-def embed(input_image, output_image, message):
-    im = Image.open(input_image)
-    if im.mode != 'RGB':
-        im = im.convert('RGB')
-    w, h = im.size
-    pixels = im.load()
-    bits = str_to_bits(message)
-    length = len(bits)
-    # store length first as 32-bit integer
-    length_bits = [(length >> (31-i)) & 1 for i in range(32)]
-    all_bits = length_bits + bits
-    max_capacity = w * h
+def embed(input_image, output_image, message, layout=None, compression=None, passphrase=None, workers=None,
+          output_format=None):
+    # layout: None/"r1" keeps the original red-LSB format, see layout.PRESETS
+    # compression: None keeps the length-prefixed format; "none"/"zlib"/"lzma" writes an STG2 container
+    # passphrase: scatter the bits over the whole image in a keyed order (needed again to extract)
+    # workers: threads for large messages (default: STEGO_THREADS), see parallel.py
+    # output_format: encoder preset, e.g. "png-fast" or "bmp" (see output_format.FORMATS); None is plain PNG
+    layout = parse_layout(layout)
+    if passphrase:
+        layout = layout.scattered()
+    with stage("pack"):
+        if compression is None:
+            bits = str_to_bits(message)
+            length = len(bits)
+            # store length first as 32-bit integer
+            all_bits = np.concatenate([int_to_bits(length, 32), bits])
+        else:
+            bits = all_bits = bytes_to_bits(pack_text(message, compression))
+    # Large PNGs only decode the rows the message needs
+    carrier = ImageCarrier(input_image, layout, len(all_bits), output_format)
+    max_capacity = layout.capacity(carrier.pixels)
     if len(all_bits) > max_capacity:
         raise Exception("Message too long for image.")
-    idx = 0
-    for y in range(h):
-        for x in range(w):
-            if idx >= len(all_bits):
-                break
-            r, g, b = pixels[x, y]
-            r = (r & 0xFE) | all_bits[idx]  # replace LSB of red channel
-            pixels[x, y] = (r, g, b)
-            idx += 1
-        if idx >= len(all_bits):
-            break
-    im.save(output_image, 'PNG')
+    with stage("decode"):
+        arr = carrier.load()
+    with stage("embed"):
+        embed_layout(arr, layout, all_bits, perm=layout_permutation(layout, carrier.pixels, passphrase),
+                     workers=workers)
+    with stage("encode"):
+        carrier.save(arr, output_image)
     print(f"Embedded {len(bits)} message bits into {output_image}")
 
 if __name__ == "__main__":
@@ -0,0 +1,95 @@
+# jobs.py
+# Background job queue: stego work runs in a process pool so a long audio
+# job does not hold a web worker. Limits come from the environment:
+#  STEGO_WORKERS      worker processes (default: CPU count)
+#  STEGO_QUEUE_DEPTH  max queued + running jobs before submit is refused (default 64)
+#  STEGO_JOB_HISTORY  finished jobs kept for status lookups (default 1000)
+#  STEGO_PREFORK      1: start every worker as soon as the pool is created instead of one
+#                     per job as load grows, so no job waits for a worker to start
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    def __init__(self, max_workers=None, max_pending=None, history=None, pool_options=None, prefork=None):
+        self.max_workers = max_workers or int(os.environ.get("STEGO_WORKERS", "0")) or os.cpu_count()
+        self.max_pending = max_pending or int(os.environ.get("STEGO_QUEUE_DEPTH", "64"))
+        self.history = history or int(os.environ.get("STEGO_JOB_HISTORY", "1000"))
+        self.pool_options = pool_options or {}  # extra ProcessPoolExecutor arguments, e.g. warm.pool_options()
+        self.prefork = os.environ.get("STEGO_PREFORK") == "1" if prefork is None else prefork
+        self._executor = None
+        self._jobs = OrderedDict()  # job id -> (Future, meta), oldest first
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Created on first use so importing the app does not fork workers
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, **self.pool_options)
+            if self.prefork:
+                # One no-op per worker: all of them start (and run the initializer) now
+                for _ in range(self.max_workers):
+                    self._executor.submit(os.getpid)
+        return self._executor
+
+    def start(self):
+        """Create the worker pool now instead of on the first submit."""
+        with self._lock:
+            self._pool()
+
+    def pending(self) -> int:
+        return sum(1 for f, _ in self._jobs.values() if not f.done())
+
+    def active_ids(self) -> set:
+        """Ids of queued or running jobs."""
+        with self._lock:
+            return {k for k, (f, _) in self._jobs.items() if not f.done()}
+
+    def submit(self, fn, *args, job_id=None, meta=None, on_done=None) -> str:
+        """Queue fn(*args); on_done(future) is called in this process once it finishes."""
+        with self._lock:
+            if self.pending() >= self.max_pending:
+                raise QueueFull("Job queue is full, try again later")
+            job_id = job_id or uuid.uuid4().hex
+            future = self._pool().submit(fn, *args)
+            self._jobs[job_id] = (future, meta)
+            self._trim()
+        if on_done is not None:
+            future.add_done_callback(on_done)
+        return job_id
+
+    def _trim(self):
+        finished = [k for k, (f, _) in self._jobs.items() if f.done()]
+        for k in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[k]
+
+    def status(self, job_id: str):
+        """{"id", "state", "result", "error", "meta"} for a known job, else None."""
+        with self._lock:
+            entry = self._jobs.get(job_id)
+        if entry is None:
+            return None  # unknown, or trimmed from the history by a concurrent submit
+        future, meta = entry
+        info = {"id": job_id, "state": "queued", "result": None, "error": None, "meta": meta}
+        if future.running():
+            info["state"] = "running"
+        elif future.done():
+            exc = future.exception()
+            if exc is None:
+                info["state"] = "done"
+                info["result"] = future.result()
+            else:
+                info["state"] = "failed"
+                info["error"] = str(exc)
+        return info
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
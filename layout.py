@@ -0,0 +1,108 @@
+# layout.py
+# Carrier bit layouts: how many low bits of each channel carry payload, which
+# channels are used and in which order the bit planes are filled (or, for
+# "scatter", a passphrase-keyed pseudo-random slot order, see scatter.py).
+# The default layout (1 LSB of the red channel, pixel order) is the original
+# format and has no header. Any other layout is announced by an 8-byte header
+# written with the default layout at the start of the carrier:
+#  MAGIC(4 bytes = b'STGL') | version(1) | bits per channel(1) | channels(1) | order(1)
+from dataclasses import dataclass, replace
+
+LAYOUT_MAGIC = b"STGL"
+LAYOUT_VERSION = 1
+HEADER_BITS = 64
+
+CHANNEL_SETS = ("R", "RGB", "RGBA")
+ORDERS = ("pixel", "plane", "scatter")
+
+
+@dataclass(frozen=True)
+class Layout:
+    bits: int = 1          # low bits used per channel sample (1-4)
+    channels: str = "R"    # one of CHANNEL_SETS
+    order: str = "pixel"   # "pixel": all bits of a sample, then the next sample
+                           # "plane": bit plane 0 of every sample, then plane 1, ...
+                           # "scatter": like "pixel", in a keyed pseudo-random sample order
+
+    def __post_init__(self):
+        if not 1 <= self.bits <= 4:
+            raise ValueError("Bits per channel must be between 1 and 4")
+        if self.channels not in CHANNEL_SETS:
+            raise ValueError(f"Channels must be one of {', '.join(CHANNEL_SETS)}")
+        if self.order not in ORDERS:
+            raise ValueError(f"Order must be one of {', '.join(ORDERS)}")
+
+    @property
+    def is_default(self) -> bool:
+        return self == DEFAULT_LAYOUT
+
+    @property
+    def nchannels(self) -> int:
+        return len(self.channels)
+
+    @property
+    def mode(self) -> str:
+        """PIL mode the carrier must be decoded to."""
+        return "RGBA" if "A" in self.channels else "RGB"
+
+    @property
+    def header_pixels(self) -> int:
+        return 0 if self.is_default else HEADER_BITS
+
+    def slots(self, pixels: int) -> int:
+        """Channel samples available for payload in a carrier of `pixels` pixels."""
+        return max(0, pixels - self.header_pixels) * self.nchannels
+
+    def capacity(self, pixels: int) -> int:
+        """Payload bits available in a carrier of `pixels` pixels."""
+        return self.slots(pixels) * self.bits
+
+    def scattered(self) -> "Layout":
+        """Same bits and channels in keyed pseudo-random order."""
+        return replace(self, order="scatter")
+
+    def to_header(self) -> bytes:
+        return LAYOUT_MAGIC + bytes([
+            LAYOUT_VERSION, self.bits, CHANNEL_SETS.index(self.channels), ORDERS.index(self.order),
+        ])
+
+    @classmethod
+    def from_header(cls, data: bytes):
+        """Layout recorded in an 8-byte header, or None if there is no layout header."""
+        if data[:4] != LAYOUT_MAGIC:
+            return None
+        version, bits, channels, order = data[4:8]
+        if version != LAYOUT_VERSION:
+            raise ValueError(f"Unsupported layout header version {version}")
+        if channels >= len(CHANNEL_SETS) or order >= len(ORDERS):
+            raise ValueError("Corrupt layout header")
+        return cls(bits, CHANNEL_SETS[channels], ORDERS[order])
+
+
+DEFAULT_LAYOUT = Layout()
+
+PRESETS = {
+    "r1": DEFAULT_LAYOUT,
+    "rgb1": Layout(1, "RGB"),
+    "rgb2": Layout(2, "RGB"),
+    "rgb4": Layout(4, "RGB"),
+    "rgba2": Layout(2, "RGBA"),
+    "rgba4": Layout(4, "RGBA"),
+}
+
+
+def parse_layout(spec) -> Layout:
+    """Accept a Layout, a preset name or 'CHANNELS:BITS[:ORDER]' (e.g. 'RGB:2:plane')."""
+    if spec is None or spec == "":
+        return DEFAULT_LAYOUT
+    if isinstance(spec, Layout):
+        return spec
+    if spec.lower() in PRESETS:
+        return PRESETS[spec.lower()]
+    parts = spec.split(":")
+    try:
+        bits = int(parts[1]) if len(parts) > 1 else 1
+    except ValueError:
+        raise ValueError(f"Invalid layout '{spec}'") from None
+    order = parts[2].lower() if len(parts) > 2 else "pixel"
+    return Layout(bits, parts[0].upper(), order)
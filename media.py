@@ -0,0 +1,18 @@
+# media.py
+# Carrier file types by extension, shared by the web app, the batch CLI and the
+# detector. Deliberately free of NumPy/PIL imports so those entry points still
+# start without loading the stego modules (see warm.py).
+from pathlib import Path
+
+IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff"}
+AUDIO_EXTS = {".wav", ".mp3", ".aac", ".m4a", ".flac", ".ogg"}
+
+
+def is_medium(name, medium: str) -> bool:
+    """True if a file name's extension is one of the carrier types for medium ("image" | "audio")."""
+    suffix = Path(name).suffix.lower()
+    if medium == "image":
+        return suffix in IMAGE_EXTS
+    if medium == "audio":
+        return suffix in AUDIO_EXTS
+    return False
@@ -0,0 +1,199 @@
+# metrics.py
+# Per-stage timing and Prometheus-style metrics. The embed/extract functions
+# wrap their phases (decode, pack, embed, extract, encode, transcode) in
+# stage(); the times add up in the trace active on the calling thread, if any,
+# and cost two perf_counter() calls otherwise. run_task returns its trace's
+# timings with the result, so jobs finished in worker processes are recorded
+# by the web process too. render() produces the /metrics text format.
+#  STEGO_PROFILE_DIR  write a cProfile dump per request/job into this directory (off by default)
+import cProfile
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_DIR = os.environ.get("STEGO_PROFILE_DIR") or None
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, math.inf)
+
+_local = threading.local()
+
+
+class Trace:
+    """Seconds spent per stage name, accumulated over repeated stages."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+
+@contextmanager
+def trace():
+    """Collect the stages run on this thread; nested traces hide the outer one until they end."""
+    outer = getattr(_local, "trace", None)
+    _local.trace = Trace()
+    try:
+        yield _local.trace
+    finally:
+        _local.trace = outer
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current = getattr(_local, "trace", None)
+        if current is not None:
+            current.add(name, time.perf_counter() - start)
+
+
+@contextmanager
+def profiled(path):
+    """Run the block under cProfile and dump the stats to path (no-op for None)."""
+    if path is None:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        profile.dump_stats(path)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+            lines.extend(self._render_series(key, value) for key, value in series)
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def _render_series(self, key, value) -> str:
+        return f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._series[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_series(self, key, value) -> str:
+        counts, total = value
+        lines = [
+            f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', _format_value(b))])} {c}"
+            for b, c in zip(self.buckets, counts)
+        ]
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return "\n".join(lines)
+
+
+REGISTRY = []
+
+_LABELS = ("medium", "action", "payload_type")
+REQUEST_SECONDS = Histogram("stego_request_seconds", "Wall time of a stego request, or of a job from submission to completion.", _LABELS)
+STAGE_SECONDS = Histogram("stego_stage_seconds", "Wall time per processing stage.", _LABELS + ("stage",))
+BYTES = Counter("stego_bytes_total", "Bytes processed: carrier (input), payload (hidden data), output (written files).",
+                ("medium", "action", "kind"))
+ERRORS = Counter("stego_errors_total", "Failed requests and jobs by reason.", _LABELS + ("reason",))
+DOWNLOAD_SECONDS = Histogram("stego_download_seconds", "Time to prepare a download response.")
+
+
+def labels_for(spec: dict) -> dict:
+    """medium/action/payload_type labels of a spec or form; unexpected values become "other"."""
+    medium, action = spec.get("medium"), spec.get("action")
+    if action == "decode":
+        payload_type = "any"  # detected on decode, not chosen
+    else:
+        payload_type = "text" if spec.get("payload_type", "text") == "text" else "file"
+    return {
+        "medium": medium if medium in ("image", "audio") else "other",
+        "action": action if action in ("encode", "decode") else "other",
+        "payload_type": payload_type,
+    }
+
+
+def record(labels: dict, seconds: float, stages: dict = None, sizes: dict = None):
+    """Record one finished request/job: total time, its stage timings and byte counts."""
+    REQUEST_SECONDS.observe(seconds, **labels)
+    for name, value in (stages or {}).items():
+        STAGE_SECONDS.observe(value, stage=name, **labels)
+    for kind, value in (sizes or {}).items():
+        if value:
+            BYTES.inc(value, medium=labels["medium"], action=labels["action"], kind=kind)
+
+
+def record_error(labels: dict, reason: str):
+    ERRORS.inc(reason=reason, **labels)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,54 @@
+# output_format.py
+# Encoder settings for stego images. Lossless output is required, but how
+# hard it is compressed is a speed/size trade-off: for large carriers zlib at
+# PIL's default level often takes longer than the embedding itself. "png" is
+# PIL's default and keeps outputs byte-identical to before; the other presets
+# trade size for speed (or the reverse), and BMP/uncompressed TIFF skip
+# compression entirely for internal hops.
+import zlib
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class OutputFormat:
+    format: str = "PNG"       # PIL format name
+    suffix: str = ".png"
+    level: int = -1           # zlib level 0-9, -1: PIL/zlib default (6)
+    strategy: int = -1        # zlib strategy, e.g. zlib.Z_RLE; -1: default
+    optimize: bool = False    # extra PNG encoder pass for a smaller file
+    alpha: bool = True        # can store an alpha channel
+
+    def save_options(self) -> dict:
+        """Keyword arguments for PIL's Image.save."""
+        if self.format == "PNG":
+            return {"compress_level": self.level, "compress_type": self.strategy, "optimize": self.optimize}
+        if self.format == "TIFF":
+            return {"compression": "raw"}
+        return {}
+
+    def compressobj(self):
+        """zlib compressor for PNG image data written outside PIL (see png_strips.py)."""
+        return zlib.compressobj(6 if self.level < 0 else self.level, zlib.DEFLATED, 15, 8,
+                                zlib.Z_DEFAULT_STRATEGY if self.strategy < 0 else self.strategy)
+
+
+FORMATS = {
+    "png": OutputFormat(),
+    "png-fast": OutputFormat(level=1, strategy=zlib.Z_RLE),
+    "png-small": OutputFormat(level=9, optimize=True),
+    "png-store": OutputFormat(level=0),
+    "bmp": OutputFormat("BMP", ".bmp", alpha=False),
+    "tiff": OutputFormat("TIFF", ".tiff"),
+}
+DEFAULT_FORMAT = FORMATS["png"]
+
+
+def parse_format(spec=None) -> OutputFormat:
+    """Accept an OutputFormat or a preset name ("png", "png-fast", "bmp", ...)."""
+    if spec is None or spec == "":
+        return DEFAULT_FORMAT
+    if isinstance(spec, OutputFormat):
+        return spec
+    if spec.lower() in FORMATS:
+        return FORMATS[spec.lower()]
+    raise ValueError(f"Unknown output format '{spec}' (expected one of {', '.join(FORMATS)})")
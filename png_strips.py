@@ -0,0 +1,226 @@
+# png_strips.py
+# Strip-wise embedding for very large PNG carriers. Payload bits sit in the
+# first rows of the image (pixel order), so only those rows are decoded and
+# modified; on save they are re-encoded unfiltered and every later scanline is
+# copied from the original IDAT stream through a streaming zlib
+# decompress/recompress. Peak memory scales with the payload, not the carrier.
+import io
+import os
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from bitplane import load_image, load_rows, save_png
+from output_format import parse_format
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Carriers below this many pixels are decoded fully (cached, and fast enough)
+STRIP_MIN_PIXELS = int(float(os.environ.get("STEGO_STRIP_MIN_MP", "16")) * 1_000_000)
+IDAT_BYTES = 256 * 1024     # size of the IDAT chunks written
+READ_BYTES = 1024 * 1024    # compressed bytes read from the source at a time
+COLOR_TYPES = {"RGB": 2, "RGBA": 6}
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}  # samples per pixel by color type
+ANIMATION_CHUNKS = {b"acTL", b"fcTL"}  # describe full-height frames, so not copied into a head PNG
+
+
+def _png_header(image):
+    """(width, height, bit depth, color type, interlace) from the IHDR, or None for non-PNG input."""
+    f = image if hasattr(image, "read") else open(image, "rb")
+    try:
+        f.seek(0)
+        head = f.read(33)
+    finally:
+        if f is not image:
+            f.close()
+    if len(head) < 33 or head[:8] != PNG_SIGNATURE or head[12:16] != b"IHDR":
+        return None
+    width, height, depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", head[16:29])
+    return width, height, depth, color_type, interlace
+
+
+def _write_chunk(out, kind: bytes, data: bytes):
+    out.write(struct.pack(">I", len(data)) + kind + data
+              + struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+
+def head_png(image, rows: int) -> io.BytesIO:
+    """The first `rows` rows of a non-interlaced PNG as a standalone in-memory PNG.
+
+    Chunks before the image data are copied (the IHDR with the new height) and
+    only the rows' filtered scanlines are inflated from the IDAT stream, then
+    stored uncompressed, so the rest of the image is never decompressed.
+    """
+    header = _png_header(image)
+    if header is None or header[4]:
+        raise ValueError("Not a non-interlaced PNG")
+    width, _, depth, color_type, _ = header
+    need = rows * (-(-width * depth * CHANNELS[color_type] // 8) + 1)
+    out = io.BytesIO()
+    out.write(PNG_SIGNATURE)
+    dec = zlib.decompressobj()
+    data = bytearray()
+    f = image if hasattr(image, "read") else open(image, "rb")
+    try:
+        f.seek(len(PNG_SIGNATURE))
+        while len(data) < need:
+            head = f.read(8)
+            if len(head) < 8:
+                raise ValueError("Truncated PNG")
+            length, kind = struct.unpack(">I", head[:4])[0], head[4:]
+            if kind != b"IDAT":
+                if data or kind == b"IEND":
+                    raise ValueError("PNG image data ends before the requested rows")
+                body = f.read(length + 4)
+                if kind == b"IHDR":
+                    _write_chunk(out, kind, body[:4] + struct.pack(">I", rows) + body[8:length])
+                elif kind not in ANIMATION_CHUNKS:
+                    out.write(head + body)  # copied verbatim with its CRC
+                continue
+            remaining = length
+            while remaining and len(data) < need:
+                chunk = f.read(min(READ_BYTES, remaining))
+                if not chunk:
+                    raise ValueError("Truncated PNG")
+                remaining -= len(chunk)
+                data += dec.decompress(chunk, need - len(data))
+                while dec.unconsumed_tail and len(data) < need:
+                    data += dec.decompress(dec.unconsumed_tail, need - len(data))
+            f.seek(remaining + 4, os.SEEK_CUR)  # rest of the chunk and its CRC
+    finally:
+        if f is not image:
+            f.close()
+    _write_chunk(out, b"IDAT", zlib.compress(bytes(data), 0))
+    _write_chunk(out, b"IEND", b"")
+    out.seek(0)
+    return out
+
+
+class ImageCarrier:
+    """An image opened for embedding `total_bits` payload bits with `layout`.
+
+    Only the header is read here, so callers can check capacity (width * height
+    pixels) first; load() then returns the array to embed into and save() writes
+    the stego image in output_format (a preset from output_format.FORMATS, PNG
+    by default). Large 8-bit non-interlaced RGB/RGBA PNGs written back as PNG,
+    whose payload ends well before the last row, are handled strip-wise;
+    anything else is decoded and saved whole, exactly as before.
+    """
+
+    def __init__(self, image, layout, total_bits: int, output_format=None):
+        self.image = image
+        self.layout = layout
+        self.output_format = parse_format(output_format)
+        if layout.mode == "RGBA" and not self.output_format.alpha:
+            raise ValueError(f"{self.output_format.format} output cannot hold an RGBA layout")
+        self.info = None
+        self.rows = None  # rows decoded in strip mode, None for a full decode
+        header = _png_header(image)
+        if header is None:
+            if hasattr(image, "seek"):
+                image.seek(0)
+            with Image.open(image) as im:
+                self.width, self.height = im.size
+            return
+        self.width, self.height, depth, color_type, interlace = header
+        if (depth == 8 and interlace == 0 and color_type == COLOR_TYPES[layout.mode]
+                and self.output_format.format == "PNG" and layout.order == "pixel" and self.width * self.height >= STRIP_MIN_PIXELS):
+            slots = -(-total_bits // layout.bits)
+            pixels = layout.header_pixels + -(-slots // layout.nchannels)
+            # One extra row: it is re-encoded too, since the next original row may be filtered against it
+            rows = -(-pixels // self.width) + 1
+            if rows < self.height:
+                self.rows = rows
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+    def load(self) -> np.ndarray:
+        if self.rows is None:
+            arr, self.info = load_image(self.image, self.layout.mode)
+            return arr
+        # load_rows decodes the whole image if the partial decode fails
+        return load_rows(self.image, self.rows, self.layout.mode)[:self.rows]
+
+    def save(self, arr: np.ndarray, output_image):
+        if self.rows is None:
+            save_png(arr, output_image, self.info, self.output_format)
+            return
+        target = output_image
+        if not hasattr(output_image, "write") and not hasattr(self.image, "read") \
+                and os.path.abspath(output_image) == os.path.abspath(self.image):
+            target = f"{output_image}.tmp"  # the source is still being read while writing
+        out = target if hasattr(target, "write") else open(target, "wb")
+        src = self.image if hasattr(self.image, "read") else open(self.image, "rb")
+        try:
+            self._splice(arr, src, out)
+        finally:
+            if src is not self.image:
+                src.close()
+            if out is not target:
+                out.close()
+        if target is not output_image:
+            os.replace(target, output_image)
+
+    def _splice(self, arr: np.ndarray, src, out):
+        src.seek(0)
+        src.read(len(PNG_SIGNATURE))
+        out.write(PNG_SIGNATURE)
+        row_bytes = self.width * arr.shape[-1]
+        skip = self.rows * (row_bytes + 1)  # filtered bytes of the rows replaced by arr
+        comp = self.output_format.compressobj()
+        dec = zlib.decompressobj()
+        pending = bytearray()
+
+        def emit(data: bytes):
+            pending.extend(comp.compress(data))
+            while len(pending) >= IDAT_BYTES:
+                _write_chunk(out, b"IDAT", bytes(pending[:IDAT_BYTES]))
+                del pending[:IDAT_BYTES]
+
+        in_idat = done_idat = False
+        while True:
+            head = src.read(8)
+            if len(head) < 8:
+                raise ValueError("Truncated PNG")
+            length, kind = struct.unpack(">I", head[:4])[0], head[4:]
+            if kind != b"IDAT" or done_idat:
+                if in_idat:
+                    # Original image data ended: flush the re-encoded stream
+                    emit(dec.flush())
+                    pending.extend(comp.flush())
+                    for start in range(0, len(pending), IDAT_BYTES):
+                        _write_chunk(out, b"IDAT", bytes(pending[start:start + IDAT_BYTES]))
+                    in_idat, done_idat = False, True
+                out.write(head + src.read(length + 4))  # copy the chunk and its CRC verbatim
+                if kind == b"IEND":
+                    return
+                continue
+
+            if not in_idat:
+                in_idat = True
+                # Modified rows first, unfiltered (filter type 0)
+                for start in range(0, self.rows, 256):
+                    block = arr[start:start + 256].reshape(-1, row_bytes)
+                    filtered = np.zeros((len(block), row_bytes + 1), dtype=np.uint8)
+                    filtered[:, 1:] = block
+                    emit(filtered.tobytes())
+            remaining = length
+            while remaining:
+                data = src.read(min(READ_BYTES, remaining))
+                if not data:
+                    raise ValueError("Truncated PNG")
+                remaining -= len(data)
+                while data:
+                    # Bounded output per call: image data can compress a thousandfold
+                    raw = dec.decompress(data, READ_BYTES)
+                    data = dec.unconsumed_tail
+                    if skip:
+                        dropped = min(skip, len(raw))
+                        skip -= dropped
+                        raw = raw[dropped:]
+                    if raw:
+                        emit(raw)
+            src.read(4)  # CRC
@@ -0,0 +1,71 @@
+# scatter.py
+# Keyed pseudo-random placement of payload slots. A passphrase-keyed balanced
+# Feistel network permutes the smallest even-bit-width power of two covering
+# the carrier; cycle-walking keeps results inside [0, size). Payload slot i
+# goes to carrier slot perm(i), and only the indices actually needed are
+# computed, so time and memory follow the payload, not the carrier.
+import hashlib
+from functools import lru_cache
+
+import numpy as np
+
+ROUNDS = 6
+KDF_ITERATIONS = 100_000
+_SALT = b"stego-scatter-v1"
+
+
+@lru_cache(maxsize=16)
+def _round_keys(passphrase: str) -> tuple:
+    # Deliberately slow (PBKDF2) so passphrases are expensive to brute-force
+    key = hashlib.pbkdf2_hmac("sha256", passphrase.encode("utf-8"), _SALT, KDF_ITERATIONS, dklen=8 * ROUNDS)
+    return tuple(np.frombuffer(key, dtype=">u8").astype(np.uint64))
+
+
+class Permutation:
+    """Keyed permutation of range(size), evaluated element-wise on index arrays."""
+
+    def __init__(self, passphrase: str, size: int):
+        if not passphrase:
+            raise ValueError("A passphrase is required for scattered embedding")
+        if size <= 0:
+            raise ValueError("Carrier has no room for a payload")
+        self.size = size
+        half = max(1, -(-(size - 1).bit_length() // 2))
+        self._half = np.uint64(half)
+        self._mask = np.uint64((1 << half) - 1)
+        self._keys = _round_keys(passphrase)
+
+    def _mix(self, right: np.ndarray, key: np.uint64) -> np.ndarray:
+        # splitmix64-style round function (uint64 arithmetic wraps), in place on one temporary
+        x = right ^ key
+        x *= np.uint64(0x9E3779B97F4A7C15)
+        x ^= x >> np.uint64(31)
+        x *= np.uint64(0xBF58476D1CE4E5B9)
+        x ^= x >> np.uint64(29)
+        x &= self._mask
+        return x
+
+    def _feistel(self, x: np.ndarray) -> np.ndarray:
+        left, right = x >> self._half, x & self._mask
+        for key in self._keys:
+            mixed = self._mix(right, key)
+            mixed ^= left
+            left, right = right, mixed
+        left <<= self._half
+        left |= right
+        return left
+
+    def __call__(self, indices, dtype=np.int64) -> np.ndarray:
+        x = np.asarray(indices, dtype=np.uint64)
+        if x.size and int(x.max()) >= self.size:
+            raise ValueError("Index outside the carrier")
+        out = self._feistel(x)
+        outside = np.flatnonzero(out >= self.size)
+        while len(outside):
+            out[outside] = self._feistel(out[outside])
+            outside = outside[out[outside] >= self.size]
+        return out.astype(dtype)
+
+    def range(self, start: int, stop: int, dtype=np.int64) -> np.ndarray:
+        """Slots for payload indices start..stop-1 (dtype np.uint32 halves the memory for sizes below 2**32)."""
+        return self(np.arange(start, stop, dtype=np.uint64), dtype)
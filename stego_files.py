@@ -0,0 +1,197 @@
+# stego_files.py
+# File-payload embed/extract for image and audio carriers (no Flask dependency,
+# so worker processes and scripts can import it cheaply).
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+from bitplane import ImageLSBReader, embed_layout, layout_permutation, bytes_to_bits, bits_to_bytes, iter_chunks
+from layout import parse_layout
+from audio_engine import WavLSBReader, wav_capacity, embed_stream, scatter_permutation
+from transcode import open_pcm
+from container import MAGIC2, ContainerError, pack, read_header, read_chunks
+from png_strips import ImageCarrier
+from audio_layout import parse_audio_layout
+from metrics import stage
+
+
+# ------------------------------
+# File-payload helpers (do not affect existing text encode/decode)
+# Header format:
+#  MAGIC(4 bytes = b'STG1') | name_len(2 bytes BE) | name UTF-8 | payload_len(4 bytes BE) | payload
+MAGIC = b"STG1"
+
+
+# Payload bytes are streamed in chunks of this size; a multiple of 12 keeps every
+# chunk slot-aligned for all bits-per-channel settings (1-4).
+CHUNK_BYTES = 12 * 64 * 1024
+
+
+def _file_header(display_name: str, size: int) -> bytes:
+    name_bytes = display_name.encode("utf-8")
+    if len(name_bytes) > 65535:
+        raise ValueError("Filename too long to embed")
+    return MAGIC + len(name_bytes).to_bytes(2, "big") + name_bytes + size.to_bytes(4, "big")
+
+
+@contextmanager
+def _payload_stream(payload):
+    """Yield (binary file object, size) for a payload path or readable file object."""
+    if hasattr(payload, "read"):
+        payload.seek(0, os.SEEK_END)
+        size = payload.tell()
+        payload.seek(0)
+        yield payload, size
+    else:
+        with open(payload, "rb") as f:
+            yield f, os.fstat(f.fileno()).st_size
+
+
+@contextmanager
+def _packed_payload(f, size: int, display_name: str, compression=None):
+    """Yield (parts, total_bytes) to embed: an STG1 header + payload, or an STG2
+    container when a compression mode ("none", "zlib", "lzma") is given."""
+    if compression is None:
+        header = _file_header(display_name, size)
+        yield [header, f], len(header) + size
+        return
+    with stage("pack"):
+        packed, packed_size = pack(f, display_name, compression)
+    with packed:
+        yield [packed], packed_size
+
+
+def _create_unique(output_dir: Path, filename: str):
+    """Create a new file for `filename` in output_dir, returning (path, binary file).
+
+    Existing files are never overwritten: " (1)", " (2)", ... is appended instead.
+    Creation is exclusive, so concurrent extractions cannot pick the same name.
+    """
+    # Prevent directory traversal
+    base_name = Path(filename).name
+    stem, suffix = Path(base_name).stem, Path(base_name).suffix
+    counter = 0
+    while True:
+        candidate = output_dir / (base_name if counter == 0 else f"{stem} ({counter}){suffix}")
+        try:
+            return candidate, open(candidate, "xb")
+        except FileExistsError:
+            counter += 1
+
+
+def _extract_container(read_bits, output_dir: Path) -> Path:
+    header = read_header(read_bits)
+    if header["text"]:
+        raise ValueError("Carrier holds a text payload, not a file. Try Text decode.")
+    out_path, f = _create_unique(Path(output_dir), header["name"])
+    try:
+        with f:
+            read_chunks(read_bits, header, f)
+    except ContainerError:
+        os.remove(out_path)  # never leave a half-written, unverified file behind
+        raise
+    return out_path
+
+
+def _extract_blob(read_bits, output_dir: Path) -> Path:
+    """Parse the header via read_bits(count, offset) and stream the payload into output_dir.
+
+    Reads both STG1 payloads and STG2 containers (see container.py).
+    """
+    # Read first 4 bytes for magic (32 bits) and name_len (16 bits)
+    head = bits_to_bytes(read_bits(48))
+    if head[:4] == MAGIC2:
+        return _extract_container(read_bits, output_dir)
+    if head[:4] != MAGIC:
+        raise ValueError("File payload not found (magic mismatch). Try Text decode.")
+    name_len = int.from_bytes(head[4:6], "big")
+    # name followed by payload_len (32 bits)
+    rest = bits_to_bytes(read_bits(name_len * 8 + 32, offset=48))
+    filename = rest[:name_len].decode("utf-8", errors="replace")
+    payload_bits_len = int.from_bytes(rest[name_len:], "big") * 8
+    offset = 48 + name_len * 8 + 32
+
+    out_path, f = _create_unique(Path(output_dir), filename)
+    with f:
+        for start in range(0, payload_bits_len, CHUNK_BYTES * 8):
+            bits = read_bits(min(CHUNK_BYTES * 8, payload_bits_len - start), offset=offset + start)
+            f.write(bits_to_bytes(bits))
+            if len(bits) < CHUNK_BYTES * 8:
+                break  # carrier ended early
+    return out_path
+
+
+def image_embed_file(input_image, output_image, payload, display_name: str, layout=None, compression=None,
+                     passphrase=None, workers=None, output_format=None):
+    """Embed a payload (path or binary file object) into an image carrier (path or file object).
+
+    compression=None writes the STG1 format; "none", "zlib" or "lzma" writes an STG2 container.
+    A passphrase scatters the bits over the carrier in a keyed order. workers
+    threads split large chunks into regions (default: STEGO_THREADS, see parallel.py).
+    output_format picks the encoder preset (see output_format.FORMATS, default plain PNG).
+    """
+    layout = parse_layout(layout)
+    if passphrase:
+        layout = layout.scattered()
+
+    with _payload_stream(payload) as (f, size), \
+            _packed_payload(f, size, display_name, compression) as (parts, total):
+        # Large PNGs only decode the rows the payload needs
+        carrier = ImageCarrier(input_image, layout, total * 8, output_format)
+        max_capacity_bits = layout.capacity(carrier.pixels)  # 1 bit (R channel LSB) per pixel by default
+        if total * 8 > max_capacity_bits:
+            raise ValueError("Payload too large for this image")
+        with stage("decode"):
+            arr = carrier.load()
+        with stage("embed"):
+            perm = layout_permutation(layout, carrier.pixels, passphrase)
+            offset = 0
+            for chunk in iter_chunks(parts, CHUNK_BYTES):
+                bits = bytes_to_bits(chunk)
+                embed_layout(arr, layout, bits, offset, perm, workers)
+                offset += len(bits)
+    with stage("encode"):
+        carrier.save(arr, output_image)
+
+
+def image_extract_file(input_image, output_dir: Path, passphrase=None, workers=None) -> Path:
+    with stage("decode"):
+        reader = ImageLSBReader(input_image, passphrase, workers)
+    with stage("extract"):
+        return _extract_blob(reader.read_bits, output_dir)
+
+
+def audio_embed_file(input_file, payload, outputs_dir: Path, display_name=None, input_name=None, stego_wav=None,
+                     compression=None, passphrase=None, workers=None, layout=None):
+    """Embed a payload into an audio carrier; file objects need display_name/input_name.
+
+    Writes outputs_dir/<stem>_file_stego.wav unless an explicit stego_wav path is given.
+    compression, passphrase and workers work as in image_embed_file. layout
+    (e.g. "s2", see audio_layout.PRESETS) uses the low bits of each sample
+    instead of every raw frame byte.
+    """
+    layout = parse_audio_layout(layout)
+    if layout is not None and passphrase:
+        layout = layout.scattered()
+    # Decode to a PCM WAV, spooled to disk when large (PCM WAV input is read in place)
+    with stage("decode"):
+        pcm = open_pcm(input_file)
+
+    name = display_name or Path(payload).name
+    with _payload_stream(payload) as (f, size), _packed_payload(f, size, name, compression) as (parts, total):
+        if total * 8 > wav_capacity(pcm, layout):
+            raise ValueError("Payload too large for this audio")
+
+        if stego_wav is None:
+            stem = Path(input_name or input_file).stem
+            stego_wav = Path(outputs_dir) / f"{stem}_file_stego.wav"
+        with stage("embed"):
+            embed_stream(pcm, stego_wav, parts, perm=scatter_permutation(pcm, passphrase, layout), workers=workers,
+                         layout=layout)
+
+    return stego_wav
+
+
+def audio_extract_file(stego_wav, outputs_dir: Path, passphrase=None) -> Path:
+    with stage("extract"), WavLSBReader(stego_wav, passphrase) as reader:
+        return _extract_blob(reader.read_bits, outputs_dir)
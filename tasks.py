@@ -0,0 +1,124 @@
+# tasks.py
+# The encode/decode work behind /process and /jobs, as a plain picklable function
+# so it can run in a worker process (see jobs.py) or inline, e.g. in tests. The
+# stego modules are imported on the first task, or when a warm worker starts
+# (see warm.py), so importing this module stays cheap.
+import os
+from pathlib import Path
+
+from output_format import parse_format
+import metrics
+
+
+def run_task(spec: dict) -> dict:
+    """Run one validated stego request.
+
+    spec keys: medium, action, payload_type, message, upload, upload_name, payload,
+    payload_name, layout, compression, passphrase, output_format, outputs_dir. upload/payload are paths or readable binary
+    file objects (e.g. request streams, embedded without saving them first).
+    Returns {"message": str | None, "downloads": [{"label", "filename", "name"}],
+    "timings": {stage: seconds}, "bytes": {"carrier", "payload", "output"}},
+    with filenames relative to outputs_dir. An optional spec["profile"] path
+    receives a cProfile dump of the task.
+    """
+    with metrics.profiled(spec.get("profile")), metrics.trace() as trace:
+        result = _run(spec)
+    result["timings"] = trace.stages
+    result["bytes"] = _byte_counts(spec, result)
+    return result
+
+
+def _size(src) -> int:
+    if src is None:
+        return 0
+    if hasattr(src, "seek"):
+        src.seek(0, os.SEEK_END)
+        size = src.tell()
+        src.seek(0)
+        return size
+    return os.path.getsize(src)
+
+
+def _byte_counts(spec: dict, result: dict) -> dict:
+    outputs_dir = Path(spec["outputs_dir"])
+    written = [_size(outputs_dir / d["filename"]) for d in result["downloads"]]
+    if spec["action"] == "encode":
+        payload = len(spec["message"].encode("utf-8")) if spec["payload_type"] == "text" else _size(spec["payload"])
+    else:
+        payload = len(result["message"].encode("utf-8")) if result["message"] is not None else sum(written)
+    return {"carrier": _size(spec["upload"]), "payload": payload, "output": sum(written)}
+
+
+def _detect_payload(upload, medium: str, passphrase) -> str:
+    from detect import payload_kind
+    with metrics.stage("detect"):
+        return payload_kind(upload, medium, passphrase)
+
+
+def _run(spec: dict) -> dict:
+    import encoding as image_encoding
+    import decoding as image_decoding
+    from encode_audio import encode_audio as audio_encode
+    from decode_audio import decode_audio as audio_decode
+    from stego_files import image_embed_file, image_extract_file, audio_embed_file, audio_extract_file
+
+    medium, action = spec["medium"], spec["action"]
+    upload = spec["upload"]
+    upload_name = Path(spec["upload_name"])
+    outputs_dir = Path(spec["outputs_dir"])
+    compression = spec.get("compression")  # None keeps the legacy formats
+    passphrase = spec.get("passphrase")  # scatters the bits; needed again to decode
+    output_format = parse_format(spec.get("output_format"))  # stego image encoder preset
+    result = {"message": None, "downloads": []}
+
+    if medium == "image":
+        if action == "encode":
+            output_name = f"{upload_name.stem}_stego{output_format.suffix}"
+            output_path = outputs_dir / output_name
+            if spec["payload_type"] == "text":
+                image_encoding.embed(upload, str(output_path), spec["message"], spec.get("layout"), compression,
+                                     passphrase, output_format=output_format)
+            else:
+                image_embed_file(upload, str(output_path), spec["payload"], spec["payload_name"], spec.get("layout"),
+                                 compression, passphrase, output_format=output_format)
+            result["downloads"].append({"label": "Download stego image", "filename": output_name})
+        else:  # decode: detect the payload type, then run only the matching extractor
+            if _detect_payload(upload, "image", passphrase) == "file":
+                out_path = image_extract_file(upload, outputs_dir, passphrase)
+                result["downloads"].append({
+                    "label": f"Download extracted file ({out_path.name})",
+                    "filename": out_path.name,
+                    "name": out_path.name,
+                })
+            else:
+                result["message"] = image_decoding.extract(upload, passphrase)
+
+    else:  # audio
+        if action == "encode":
+            if spec["payload_type"] == "text":
+                stego_wav, alt_out = audio_encode(upload, spec["message"], outputs_dir, name=upload_name.name,
+                                                  compression=compression, passphrase=passphrase,
+                                                  layout=spec.get("layout"))
+                result["downloads"].append({"label": "Download stego WAV", "filename": stego_wav.name})
+                if alt_out != stego_wav and alt_out.exists():
+                    result["downloads"].append({
+                        "label": f"Download stego {upload_name.suffix[1:].upper()}",
+                        "filename": alt_out.name,
+                    })
+            else:
+                stego_wav = audio_embed_file(upload, spec["payload"], outputs_dir,
+                                             spec["payload_name"], upload_name.name, compression=compression,
+                                             passphrase=passphrase, layout=spec.get("layout"))
+                result["downloads"].append({"label": "Download stego WAV", "filename": stego_wav.name})
+        else:  # decode: detect the payload type, then run only the matching extractor
+            if _detect_payload(upload, "audio", passphrase) == "file":
+                out_path = audio_extract_file(upload, outputs_dir, passphrase)
+                result["downloads"].append({
+                    "label": f"Download extracted file ({out_path.name})",
+                    "filename": out_path.name,
+                    "name": out_path.name,
+                })
+            else:
+                result["message"] = audio_decode(upload, passphrase)
+
+    return result
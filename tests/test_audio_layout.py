@@ -0,0 +1,65 @@
+import wave
+
+import numpy as np
+import pytest
+
+from audio_engine import WavLSBReader
+from audio_layout import AudioLayout, parse_audio_layout
+from decode_audio import decode_audio
+from encode_audio import encode_audio
+from stego_files import audio_embed_file, audio_extract_file
+
+
+def write_wav(path, frames, nchannels, sampwidth):
+    raw = np.random.default_rng(13).integers(0, 256, frames * nchannels * sampwidth, dtype=np.uint8)
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(nchannels)
+        wav.setsampwidth(sampwidth)
+        wav.setframerate(8000)
+        wav.writeframes(raw.tobytes())
+    return path
+
+
+def read_frames(path):
+    with wave.open(str(path), "rb") as wav:
+        return np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.uint8), wav.getsampwidth()
+
+
+@pytest.mark.parametrize("sampwidth", [1, 2, 3, 4])
+@pytest.mark.parametrize("spec, nchannels", [("s1", 1), ("s2", 2), ("s4", 2), ("3:1", 2), ("2:0,2", 3)])
+def test_sample_layout_round_trip(tmp_path, sampwidth, spec, nchannels):
+    carrier = write_wav(tmp_path / "carrier.wav", 6000, nchannels, sampwidth)
+    message = f"{spec} at {8 * sampwidth} bits: " + "x" * 300
+    stego, _ = encode_audio(str(carrier), message, tmp_path, compression="zlib", layout=spec)
+    with WavLSBReader(str(stego)) as reader:
+        assert reader.layout == parse_audio_layout(spec)
+    assert decode_audio(str(stego)) == message
+
+    # Only the low bits of each sample's least significant byte may change
+    before, _ = read_frames(carrier)
+    after, _ = read_frames(stego)
+    changed = np.flatnonzero(before != after)
+    assert (changed % sampwidth == 0).all()
+    keep = ~np.uint8((1 << parse_audio_layout(spec).bits) - 1)
+    assert np.array_equal(before & keep, after & keep)
+
+
+@pytest.mark.parametrize("sampwidth", [1, 2, 3, 4])
+def test_scattered_sample_layout_file_round_trip(tmp_path, sampwidth):
+    carrier = write_wav(tmp_path / "carrier.wav", 20_000, 2, sampwidth)
+    payload = tmp_path / "payload.bin"
+    payload.write_bytes(np.random.default_rng(14).integers(0, 256, 4000, dtype=np.uint8).tobytes())
+    stego = audio_embed_file(str(carrier), str(payload), tmp_path, layout="s2", passphrase="hunter2")
+    with WavLSBReader(str(stego)) as reader:
+        assert reader.layout == AudioLayout(2, order="scatter") and reader.needs_passphrase
+    out = tmp_path / "out"
+    out.mkdir()
+    assert audio_extract_file(str(stego), out, passphrase="hunter2").read_bytes() == payload.read_bytes()
+
+
+def test_header_round_trip():
+    for layout in (AudioLayout(1), AudioLayout(3, (0, 2)), AudioLayout(4, (1,), "scatter")):
+        assert AudioLayout.from_header(layout.to_header()) == layout
+    assert AudioLayout.from_header(b"RIFF\x01\x01\x00\x00") is None
+    with pytest.raises(ValueError, match="does not exist"):
+        AudioLayout(1, (2,)).selected(2)
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import bitplane
+import png_strips
+
+
+def test_load_rows_matches_full_decode(tmp_path, monkeypatch):
+    arr = np.random.default_rng(4).integers(0, 256, (120, 50, 3), dtype=np.uint8)
+    path = str(tmp_path / "carrier.png")
+    Image.fromarray(arr).save(path)
+    partial = bitplane.load_rows(path, 10)
+    assert partial.shape == (10, 50, 3) and (partial == arr[:10]).all()
+
+    def broken(image, rows):
+        raise OSError("image file is truncated")
+    monkeypatch.setattr(png_strips, "head_png", broken)
+    assert (bitplane.load_rows(path, 10) == arr).all()
+
+
+@pytest.mark.parametrize("mode", ["L", "P", "LA", "RGBA", "I;16", "1"])
+def test_load_rows_other_color_types(tmp_path, mode):
+    rgb = np.random.default_rng(5).integers(0, 256, (90, 37, 3), dtype=np.uint8)
+    path = tmp_path / "carrier.png"
+    Image.fromarray(rgb).convert(mode).save(path)
+    assert Image.open(png_strips.head_png(str(path), 7)).size == (37, 7)
+    with open(path, "rb") as f:
+        partial = bitplane.load_rows(f, 7)
+    assert (partial == np.array(Image.open(path).convert("RGB"))[:7]).all()
+
+
+def test_load_rows_across_idat_chunks(tmp_path):
+    arr = np.random.default_rng(6).integers(0, 256, (400, 300, 3), dtype=np.uint8)
+    path = tmp_path / "carrier.png"
+    Image.fromarray(arr).save(path)
+    assert path.read_bytes().count(b"IDAT") > 1
+    assert (bitplane.load_rows(str(path), 300) == arr[:300]).all()
+
+
+def test_load_rows_skips_rest_of_image_data(tmp_path):
+    path = tmp_path / "carrier.png"
+    Image.fromarray(np.zeros((400, 300, 3), dtype=np.uint8)).save(path)
+    data = path.read_bytes()
+    cut = data.index(b"IDAT") + 60  # image data broken after its first rows
+    path.write_bytes(data[:cut] + bytes(len(data) - cut))
+    assert (bitplane.load_rows(str(path), 2) == 0).all()
@@ -0,0 +1,48 @@
+import io
+
+import numpy as np
+import pytest
+
+from bitplane import bytes_to_bits
+from container import ContainerError, pack, read_chunks, read_header, unpack_text
+from stego_files import _extract_container
+
+
+def bit_reader(data: bytes):
+    bits = bytes_to_bits(data)
+    return lambda count, offset=0: bits[offset:offset + count]
+
+
+def packed(raw: bytes, compression="zlib", text=False) -> bytes:
+    out, _ = pack(io.BytesIO(raw), name="notes.bin", compression=compression, text=text, chunk_size=1000)
+    with out:
+        return out.read()
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib", "lzma"])
+def test_round_trip(compression):
+    raw = np.random.default_rng(9).integers(0, 4, 3500, dtype=np.uint8).tobytes()
+    read_bits = bit_reader(packed(raw, compression))
+    header = read_header(read_bits)
+    assert (header["name"], header["compression"], header["text"]) == ("notes.bin", compression, False)
+    sink = io.BytesIO()
+    assert read_chunks(read_bits, header, sink) == len(raw)
+    assert sink.getvalue() == raw
+
+
+def test_crc_mismatch_names_the_chunk(tmp_path):
+    data = bytearray(packed(bytes(3000), "none"))
+    data[-8 - 500] ^= 0x01  # inside the stored bytes of the last chunk
+    read_bits = bit_reader(bytes(data))
+    with pytest.raises(ContainerError, match="chunk 2 failed its CRC32 check"):
+        read_chunks(read_bits, read_header(read_bits), io.BytesIO())
+    with pytest.raises(ContainerError, match="CRC32"):
+        _extract_container(read_bits, tmp_path)
+    assert not list(tmp_path.iterdir())  # no half-written file is left behind
+
+
+@pytest.mark.parametrize("keep", [5, 12, 40, 1500])
+def test_truncated_container(keep):
+    read_bits = bit_reader(packed("some text".encode() * 200, "none", text=True)[:keep])
+    with pytest.raises(ContainerError, match="truncated"):
+        unpack_text(read_bits)
@@ -0,0 +1,100 @@
+import wave
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import audio_engine
+from decode_audio import decode_audio
+from detect import detect, payload_kind
+from encode_audio import encode_audio
+from tasks import run_task
+
+
+def write_wav(path, samples):
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(44100)
+        wav.writeframes(np.asarray(samples, dtype="<i2").tobytes())
+    return path
+
+
+def decode_spec(path, medium, tmp_path):
+    return {"medium": medium, "action": "decode", "payload_type": "text", "message": "", "upload": str(path),
+            "upload_name": path.name, "payload": None, "payload_name": None, "outputs_dir": str(tmp_path)}
+
+
+@pytest.mark.parametrize("samples", [
+    np.full(200_000, -1),                                        # constant -1: LSB bytes 0xFF
+    np.random.default_rng(0).choice([-1, 1], 200_000),           # dithered +-1: bytes 0xAA-0xFF
+])
+def test_clean_audio_is_not_verified_text(tmp_path, samples):
+    path = write_wav(tmp_path / "clean.wav", samples)
+    info = detect(str(path))
+    assert not (info["payload"] and info["verified"])
+    with pytest.raises(ValueError, match="No hidden data"):
+        run_task(decode_spec(path, "audio", tmp_path))
+
+
+def test_audio_text_read_is_capped(tmp_path, monkeypatch):
+    path = write_wav(tmp_path / "clean.wav", np.full(400_000, -1))
+    seen = []
+    read = wave.Wave_read.readframes
+    monkeypatch.setattr(wave.Wave_read, "readframes", lambda self, n: seen.append(n) or read(self, n))
+    with pytest.raises(ValueError, match="No hidden data"):
+        audio_engine.extract_text(str(path), max_bytes=1000)
+    assert sum(seen) * 4 < 400_000 * 2  # stopped well before the end of the carrier
+
+
+def test_audio_text_with_any_bytes_decodes(tmp_path):
+    carrier = write_wav(tmp_path / "carrier.wav", np.random.default_rng(1).integers(-3000, 3000, 200_000))
+    message = "It’s “here”"  # stored as low bytes 0x19, 0x1C, 0x1D
+    stego, _ = encode_audio(str(carrier), message, tmp_path)
+    info = detect(str(stego))
+    assert (info["payload"], info["verified"], info["size"]) == ("text", True, len(message))
+    expected = "It\x19s \x1chere\x1d"
+    assert decode_audio(str(stego)) == expected
+    assert run_task(decode_spec(stego, "audio", tmp_path))["message"] == expected
+
+
+@pytest.mark.parametrize("message", ["STG2", "STG2 notes for later"])
+def test_audio_text_starting_with_container_magic(tmp_path, message):
+    carrier = write_wav(tmp_path / "carrier.wav", np.random.default_rng(4).integers(-3000, 3000, 200_000))
+    stego, _ = encode_audio(str(carrier), message, tmp_path)
+    info = detect(str(stego))
+    assert (info["payload"], info["format"], info["size"]) == ("text", "text", len(message))
+    assert decode_audio(str(stego)) == message
+    assert run_task(decode_spec(stego, "audio", tmp_path))["message"] == message
+
+
+def write_png(path, arr):
+    Image.fromarray(np.asarray(arr, dtype=np.uint8), "RGB").save(path)
+    return path
+
+
+@pytest.mark.parametrize("top", [0, 40])
+def test_dark_image_is_not_text(tmp_path, top):
+    arr = np.random.default_rng(3).integers(0, 256, (64, 64, 3))
+    arr[:top or 64] = 0  # dark top border, or a black image
+    path = write_png(tmp_path / "dark.png", arr)
+    assert detect(str(path))["payload"] is None
+    with pytest.raises(ValueError, match="No hidden data found in this image"):
+        payload_kind(str(path))
+
+
+def test_image_text_is_detected(tmp_path):
+    import encoding
+    carrier = write_png(tmp_path / "carrier.png", np.zeros((64, 64, 3)))
+    encoding.embed(str(carrier), str(tmp_path / "stego.png"), "It’s “here”")
+    info = detect(str(tmp_path / "stego.png"))
+    assert (info["payload"], info["verified"], info["size"]) == ("text", True, 11)
+
+
+def test_long_audio_text_is_unverified_but_decodes(tmp_path):
+    carrier = write_wav(tmp_path / "carrier.wav", np.random.default_rng(2).integers(-3000, 3000, 200_000))
+    message = "x" * 5000
+    stego, _ = encode_audio(str(carrier), message, tmp_path)
+    info = detect(str(stego))
+    assert (info["payload"], info["verified"]) == ("text", False)
+    assert run_task(decode_spec(stego, "audio", tmp_path))["message"] == message
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import decoding
+import encoding
+from bitplane import layout_permutation
+from layout import Layout, parse_layout
+
+MESSAGE = "layouts: " + "0123456789" * 40
+
+
+@pytest.fixture
+def carrier(tmp_path):
+    path = tmp_path / "carrier.png"
+    arr = np.random.default_rng(12).integers(0, 256, (80, 60, 4), dtype=np.uint8)
+    Image.fromarray(arr, "RGBA").save(path)
+    return path
+
+
+@pytest.mark.parametrize("spec", ["r1", "rgb1", "rgb2", "rgb4", "rgba2", "rgba4", "RGB:3:plane", "RGBA:1:plane"])
+def test_layout_round_trip(carrier, tmp_path, spec):
+    stego = tmp_path / "stego.png"
+    encoding.embed(str(carrier), str(stego), MESSAGE, layout=spec)
+    assert decoding.extract(str(stego)) == MESSAGE
+
+
+@pytest.mark.parametrize("spec", ["rgb2", "RGBA:4:plane"])
+def test_scattered_layout_round_trip(carrier, tmp_path, spec):
+    stego = tmp_path / "stego.png"
+    encoding.embed(str(carrier), str(stego), MESSAGE, layout=spec, passphrase="hunter2")
+    assert decoding.extract(str(stego), passphrase="hunter2") == MESSAGE
+    with pytest.raises(ValueError, match="passphrase"):
+        decoding.extract(str(stego))
+
+
+@pytest.mark.parametrize("spec", ["r1", "RGB:3", "RGBA:2"])
+def test_scattered_slots_are_distinct(spec):
+    layout = parse_layout(spec).scattered()
+    perm = layout_permutation(layout, 80 * 60, "hunter2")
+    slots = perm.range(0, layout.slots(80 * 60))
+    assert len(np.unique(slots)) == layout.slots(80 * 60) and slots.max() < layout.slots(80 * 60)
+
+
+def test_header_round_trip():
+    for layout in (Layout(3, "RGB", "plane"), Layout(4, "RGBA", "scatter"), Layout(1, "R", "pixel")):
+        assert Layout.from_header(layout.to_header()) == layout
+    assert Layout.from_header(b"PNG!\x01\x01\x00\x00") is None
@@ -0,0 +1,89 @@
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image
+
+import png_strips
+from layout import DEFAULT_LAYOUT
+from png_strips import ImageCarrier
+
+
+def chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)))
+
+
+def paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    return a if pa <= pb and pa <= pc else b if pb <= pc else c
+
+
+def filtered_rows(arr):
+    """Scanlines cycling through all five filter types."""
+    h, w, bpp = arr.shape
+    rows = arr.reshape(h, w * bpp).astype(int)
+    out = bytearray()
+    prev = np.zeros(w * bpp, dtype=int)
+    for y, row in enumerate(rows):
+        kind = y % 5
+        left = np.concatenate([np.zeros(bpp, dtype=int), row[:-bpp]])
+        upleft = np.concatenate([np.zeros(bpp, dtype=int), prev[:-bpp]])
+        if kind == 0:
+            pred = np.zeros_like(row)
+        elif kind == 1:
+            pred = left
+        elif kind == 2:
+            pred = prev
+        elif kind == 3:
+            pred = (left + prev) // 2
+        else:
+            pred = np.array([paeth(a, b, c) for a, b, c in zip(left, prev, upleft)])
+        out.append(kind)
+        out += ((row - pred) % 256).astype(np.uint8).tobytes()
+        prev = row
+    return bytes(out)
+
+
+def write_png(path, arr, idat_size=100):
+    h, w, _ = arr.shape
+    stream = zlib.compress(filtered_rows(arr), 9)
+    data = png_strips.PNG_SIGNATURE + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))
+    data += chunk(b"gAMA", struct.pack(">I", 45455)) + chunk(b"tEXt", b"Comment\x00before")
+    data += b"".join(chunk(b"IDAT", stream[i:i + idat_size]) for i in range(0, len(stream), idat_size))
+    data += chunk(b"tEXt", b"Author\x00after") + chunk(b"IEND", b"")
+    path.write_bytes(data)
+    return path
+
+
+def test_splice_filtered_multi_idat_png(tmp_path, monkeypatch):
+    monkeypatch.setattr(png_strips, "STRIP_MIN_PIXELS", 0)
+    arr = np.random.default_rng(7).integers(0, 256, (60, 24, 3), dtype=np.uint8)
+    src = write_png(tmp_path / "carrier.png", arr)
+    assert np.array_equal(np.array(Image.open(src)), arr)  # the hand-written PNG itself is valid
+
+    carrier = ImageCarrier(str(src), DEFAULT_LAYOUT, 24 * 5)
+    assert carrier.rows is not None and carrier.rows < 60
+    head = carrier.load()
+    assert np.array_equal(head, arr[:carrier.rows])
+    head[:-1] ^= 1  # flip the LSBs of the payload rows; the last row is re-encoded unchanged
+    carrier.save(head, str(tmp_path / "stego.png"))
+
+    with Image.open(tmp_path / "stego.png") as out:
+        stego = np.array(out)  # text after the image data is read with it
+        assert out.info.get("Comment") == "before" and out.info.get("Author") == "after"
+        assert "gamma" in out.info
+    assert np.array_equal(stego[:carrier.rows - 1], arr[:carrier.rows - 1] ^ 1)
+    assert np.array_equal(stego[carrier.rows - 1:], arr[carrier.rows - 1:])
+
+
+def test_splice_in_place(tmp_path, monkeypatch):
+    monkeypatch.setattr(png_strips, "STRIP_MIN_PIXELS", 0)
+    arr = np.random.default_rng(8).integers(0, 256, (40, 16, 3), dtype=np.uint8)
+    path = write_png(tmp_path / "carrier.png", arr, idat_size=1 << 20)
+    carrier = ImageCarrier(str(path), DEFAULT_LAYOUT, 16)
+    head = carrier.load()
+    head[:-1] = 0
+    carrier.save(head, str(path))
+    stego = np.array(Image.open(path))
+    assert not stego[:carrier.rows - 1].any() and np.array_equal(stego[carrier.rows - 1:], arr[carrier.rows - 1:])
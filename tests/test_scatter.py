@@ -0,0 +1,58 @@
+import io
+import wave
+
+import numpy as np
+import pytest
+
+import audio_engine
+from audio_engine import WavLSBReader, embed_stream, scatter_permutation
+from audio_layout import AudioLayout
+from scatter import Permutation
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 17, 256, 1000, 4097, 65537])
+def test_permutation_is_a_bijection(size):
+    perm = Permutation("hunter2", size)
+    out = perm.range(0, size)
+    assert out.min() >= 0 and out.max() < size
+    assert len(np.unique(out)) == size
+
+
+def test_range_matches_call_in_any_blocks():
+    perm = Permutation("hunter2", 100_003)
+    whole = perm(np.arange(100_003))
+    blocks = [perm.range(lo, min(lo + 4096, 100_003), dtype=np.uint32) for lo in range(0, 100_003, 4096)]
+    assert np.array_equal(np.concatenate(blocks), whole)
+    assert np.array_equal(perm.range(500, 600), whole[500:600])
+    with pytest.raises(ValueError, match="outside"):
+        perm.range(100_000, 100_004)
+
+
+def test_passphrase_changes_the_order():
+    assert not np.array_equal(Permutation("a", 5000).range(0, 5000), Permutation("b", 5000).range(0, 5000))
+
+
+def wav_bytes(frames, nchannels, sampwidth):
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(nchannels)
+        wav.setsampwidth(sampwidth)
+        wav.setframerate(8000)
+        raw = np.random.default_rng(10).integers(0, 256, frames * nchannels * sampwidth, dtype=np.uint8)
+        wav.writeframes(raw.tobytes())
+    return buf
+
+
+@pytest.mark.parametrize("layout", [None, AudioLayout(2, order="scatter")])
+def test_scattered_audio_in_small_blocks(monkeypatch, layout):
+    # Several permutation blocks, spill file on disk and worker batches, as for a large payload
+    monkeypatch.setattr(audio_engine, "SCATTER_BLOCK_SLOTS", 1000)
+    monkeypatch.setattr(audio_engine, "SPILL_BYTES", 4096)
+    src = wav_bytes(30_000, 2, 2)
+    payload = np.random.default_rng(11).integers(0, 256, 3000, dtype=np.uint8).tobytes()
+    dst = io.BytesIO()
+    embed_stream(src, dst, [payload[:1234], payload[1234:]], chunk_frames=2048, workers=3, layout=layout,
+                 perm=scatter_permutation(src, "hunter2", layout))
+    with WavLSBReader(dst, "hunter2") as reader:
+        assert np.packbits(reader.read_bits(len(payload) * 8)).tobytes() == payload
+        assert np.packbits(reader.read_bits(800, offset=8000)).tobytes() == payload[1000:1100]
@@ -0,0 +1,162 @@
+# transcode.py
+# Pluggable audio decoders that hand PCM to the stego engine as a WAV file
+# object, streamed as it decodes (in memory up to SPOOL_BYTES, then a temp file).
+# Backends are tried in order: PCM WAV passthrough, the optional `soundfile`
+# library, then an ffmpeg pipe. Decoded PCM that fits the cache is kept by
+# content hash so a carrier uploaded more than once is only decoded once (see
+# carrier_cache.py).
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import wave
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from audio_engine import open_wav
+from carrier_cache import PCM_CACHE, file_digest
+
+FFMPEG = os.environ.get("STEGO_FFMPEG", "ffmpeg")
+
+# Same target format the old temp-file conversion used
+RATE, CHANNELS, SAMPWIDTH = 44100, 2, 2
+
+# Lossless inputs: the stego WAV is the final output, no re-encode needed
+LOSSLESS_EXTS = {".wav", ".flac"}
+
+SPOOL_BYTES = 8 * 1024 * 1024  # decoded WAVs larger than this spill to a temp file
+PIPE_BYTES = 1024 * 1024  # decoded PCM read per step
+
+
+def _spool_wav(blocks, rate: int, channels: int, sampwidth: int):
+    """Write PCM blocks into a WAV as they arrive; returns the rewound spooled file."""
+    out = tempfile.SpooledTemporaryFile(SPOOL_BYTES)
+    with wave.open(out, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(sampwidth)
+        wav.setframerate(rate)
+        for block in blocks:
+            wav.writeframesraw(block)
+    out.seek(0)
+    return out
+
+
+def _is_pcm_wav(src) -> bool:
+    try:
+        with open_wav(src):
+            return True
+    except (wave.Error, EOFError):
+        return False
+
+
+def _decode_soundfile(src):
+    try:
+        import soundfile
+    except ImportError:
+        return None
+    if hasattr(src, "seek"):
+        src.seek(0)
+    try:
+        sf = soundfile.SoundFile(src if hasattr(src, "read") else str(src))
+    except RuntimeError:
+        return None
+    with sf:
+        frames = max(1, PIPE_BYTES // (2 * sf.channels))
+        blocks = (np.ascontiguousarray(block).tobytes()
+                  for block in sf.blocks(frames, dtype='int16', always_2d=True))
+        return _spool_wav(blocks, sf.samplerate, sf.channels, 2)
+
+
+@contextmanager
+def ffmpeg_input(src):
+    """(ffmpeg input argument, stdin) for a path or binary file object.
+
+    Paths, and file objects opened from one, are given to ffmpeg by path so it
+    can seek; other streams with a descriptor are fed on stdin, and in-memory
+    streams are copied to a temp file first rather than read into one buffer.
+    """
+    if not hasattr(src, "read"):
+        yield str(src), None
+        return
+    src.seek(0)
+    name = getattr(src, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        yield name, None
+        return
+    try:
+        src.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):  # in-memory stream without a descriptor
+        with tempfile.NamedTemporaryFile() as tmp:
+            shutil.copyfileobj(src, tmp, PIPE_BYTES)
+            tmp.flush()
+            src.seek(0)
+            yield tmp.name, None
+        return
+    yield "pipe:0", src
+
+
+def _decode_ffmpeg(src):
+    # Raw s16le on stdout, written into the WAV as it arrives: a piped WAV
+    # header cannot carry the final data size.
+    with ffmpeg_input(src) as (source, stdin), tempfile.TemporaryFile() as errors:
+        proc = subprocess.Popen([
+            FFMPEG, "-v", "error", "-i", source,
+            "-ar", str(RATE), "-ac", str(CHANNELS), "-f", "s16le", "-"
+        ], stdin=stdin, stdout=subprocess.PIPE, stderr=errors)
+        with proc.stdout:
+            wav = _spool_wav(iter(lambda: proc.stdout.read(PIPE_BYTES), b""), RATE, CHANNELS, SAMPWIDTH)
+        if proc.wait() != 0:
+            wav.close()
+            errors.seek(0)
+            raise ValueError(f"Could not decode audio: {errors.read().decode(errors='replace').strip()}")
+    return wav
+
+
+DECODERS = [_decode_soundfile, _decode_ffmpeg]
+
+
+def decode_to_wav(input_file):
+    """Decode any supported audio file to a rewound WAV file object.
+
+    Results that fit PCM_CACHE are kept there by content hash; larger ones are
+    handed back as the spooled file they were decoded into and not cached.
+    """
+    key = file_digest(input_file)
+    wav_bytes = PCM_CACHE.get(key)
+    if wav_bytes is not None:
+        return io.BytesIO(wav_bytes)
+    for decoder in DECODERS:
+        wav = decoder(input_file)
+        if wav is None:
+            continue
+        wav.seek(0, os.SEEK_END)
+        size = wav.tell()
+        wav.seek(0)
+        if size > PCM_CACHE.max_bytes:
+            return wav
+        with wav:
+            wav_bytes = wav.read()
+        PCM_CACHE.put(key, wav_bytes)
+        return io.BytesIO(wav_bytes)
+    raise ValueError("No audio decoder available")
+
+
+def open_pcm(input_file):
+    """Return something wave.open() can read: the path (or file object) itself for PCM WAV, else a decoded WAV file."""
+    if _is_pcm_wav(input_file):
+        return input_file if hasattr(input_file, "read") else str(input_file)
+    return decode_to_wav(input_file)
+
+
+def needs_reencode(name) -> bool:
+    return Path(name).suffix.lower() not in LOSSLESS_EXTS
+
+
+def encode_from_wav(stego_wav, output_file):
+    """Re-encode a stego WAV into a listening copy (lossy formats only)."""
+    subprocess.run([
+        FFMPEG, "-y", "-v", "error", "-i", str(stego_wav), str(output_file)
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
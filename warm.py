@@ -0,0 +1,35 @@
+# warm.py
+# Warm worker processes. The stego modules pull in NumPy and PIL, which take
+# longer to import than a small embed takes to run, so the entry points
+# (app.py, tasks.py, batch.py, detect.py) import them lazily and importing the
+# web app or starting a CLI loads neither. Process pools built with
+# pool_options() load the modules once per worker, as the worker starts,
+# instead of inside its first task.
+#  STEGO_START_METHOD  start method for worker pools: fork, forkserver or spawn (default:
+#                      forkserver where available, else the platform default). With forkserver
+#                      the modules are imported once, in the fork server, and every worker is
+#                      forked from it already warm, without inheriting the web process's threads.
+import importlib
+import multiprocessing
+import os
+
+MODULES = ("numpy", "PIL.Image", "bitplane", "png_strips", "encoding", "decoding", "audio_engine",
+           "encode_audio", "decode_audio", "stego_files", "detect")
+START_METHOD = os.environ.get("STEGO_START_METHOD") or None
+
+
+def preload(modules=MODULES):
+    """Import the stego modules (and NumPy/PIL) now rather than on first use."""
+    for name in modules:
+        importlib.import_module(name)
+
+
+def pool_options(modules=MODULES) -> dict:
+    """ProcessPoolExecutor keyword arguments for workers that start with modules imported."""
+    method = START_METHOD
+    if method is None and "forkserver" in multiprocessing.get_all_start_methods():
+        method = "forkserver"
+    context = multiprocessing.get_context(method)
+    if context.get_start_method() == "forkserver":
+        context.set_forkserver_preload(list(modules))
+    return {"mp_context": context, "initializer": preload, "initargs": (tuple(modules),)}